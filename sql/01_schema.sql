@@ -1,6 +1,10 @@
 
+-- contracts, measure_scores, measure_values and cut_points are partitioned by
+-- rating year; 03_transform.py creates each year's partitions (contracts_2025,
+-- ...) before loading it. Databases created before partitioning are migrated
+-- by run_pipeline.py, which drops and rebuilds these derived tables.
 CREATE TABLE IF NOT EXISTS contracts (
-    contract_id TEXT PRIMARY KEY,
+    contract_id TEXT,
     organization_type TEXT,
     contract_name TEXT,
     marketing_name TEXT,
@@ -9,8 +13,9 @@ CREATE TABLE IF NOT EXISTS contracts (
     part_c_summary_star NUMERIC(2,1),
     part_d_summary_star NUMERIC(2,1),
     overall_star_rating NUMERIC(2,1),
-    year INT
-);
+    year INT,
+    PRIMARY KEY (year, contract_id)
+) PARTITION BY LIST (year);
 
 CREATE TABLE IF NOT EXISTS measure_metadata (
     measure_id TEXT PRIMARY KEY,
@@ -21,36 +26,137 @@ CREATE TABLE IF NOT EXISTS measure_metadata (
 );
 
 CREATE TABLE IF NOT EXISTS measure_scores (
-    contract_id TEXT REFERENCES contracts(contract_id),
+    contract_id TEXT,
     measure_id TEXT REFERENCES measure_metadata(measure_id),
     score NUMERIC(3,1),
     year INT,
-    PRIMARY KEY (contract_id, measure_id, year)
+    PRIMARY KEY (year, contract_id, measure_id),
+    FOREIGN KEY (year, contract_id) REFERENCES contracts(year, contract_id)
+) PARTITION BY LIST (year);
+
+-- Raw measure performance (e.g. 86 for "86%") from the Measure Data tables
+CREATE TABLE IF NOT EXISTS measure_values (
+    contract_id TEXT,
+    measure_id TEXT REFERENCES measure_metadata(measure_id),
+    value NUMERIC(12,6),
+    unit TEXT,
+    year INT,
+    PRIMARY KEY (year, contract_id, measure_id),
+    FOREIGN KEY (year, contract_id) REFERENCES contracts(year, contract_id)
+) PARTITION BY LIST (year);
+
+-- Denormalized contract x measure facts for the Power BI exports and analysis
+-- queries; refreshed per year at the end of 03_transform.py
+CREATE TABLE IF NOT EXISTS contract_measure_facts (
+    year INT,
+    contract_id TEXT,
+    measure_id TEXT,
+    contract_name TEXT,
+    organization_type TEXT,
+    parent_organization TEXT,
+    snp_flag TEXT,
+    overall_star_rating NUMERIC(2,1),
+    part_c_summary_star NUMERIC(2,1),
+    part_d_summary_star NUMERIC(2,1),
+    bonus_status TEXT,
+    measure_name TEXT,
+    domain TEXT,
+    weight NUMERIC(3,1),
+    score NUMERIC(3,1),
+    PRIMARY KEY (year, contract_id, measure_id)
+);
+
+-- Parent organization x organization type x SNP x domain rollup of the facts
+-- per year, for the Power BI model. Built with GROUPING SETS: a NULL dimension
+-- with its grouping_id bit set means "all" (8 = parent_organization,
+-- 4 = organization_type, 2 = snp_flag, 1 = domain; 15 is the year total)
+CREATE TABLE IF NOT EXISTS parent_org_rollup (
+    year INT,
+    grouping_id INT,
+    parent_organization TEXT,
+    organization_type TEXT,
+    snp_flag TEXT,
+    domain TEXT,
+    contracts INT,
+    scored_measures INT,
+    weighted_avg_stars NUMERIC(3,2),
+    bonus_eligible_share NUMERIC(5,4),
+    near_bonus_contracts INT
 );
 
 CREATE TABLE IF NOT EXISTS cut_points (
     measure_id TEXT REFERENCES measure_metadata(measure_id),
     star_level NUMERIC(2,1),
-    cut_point NUMERIC(5,2),
+    cut_point NUMERIC(12,6),
+    operator TEXT,
+    unit TEXT,
+    year INT,
+    PRIMARY KEY (year, measure_id, star_level)
+) PARTITION BY LIST (year);
+
+
+-- ETL run manifest: input hash and row count of every stage per rating year,
+-- used to skip unchanged years on reruns (see etl_manifest.py)
+CREATE TABLE IF NOT EXISTS etl_manifest (
+    stage TEXT,
     year INT,
-    PRIMARY KEY (measure_id, star_level, year)
+    source_hash TEXT,
+    row_count INT,
+    updated_at TIMESTAMP DEFAULT now(),
+    PRIMARY KEY (stage, year)
 );
 
 
-CREATE TABLE IF NOT EXISTS staging_summary_ratings (
+-- Data quality results, written by the load and transform stages in the same
+-- transaction as the data they check (see validation.py): counts per check,
+-- column and reason, and every rejected row or cell
+CREATE TABLE IF NOT EXISTS data_quality_report (
+    stage TEXT,
+    year INT,
+    check_name TEXT,
+    column_name TEXT,
+    reason TEXT,
+    row_count INT,
+    checked_at TIMESTAMP DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS rejected_rows (
+    stage TEXT,
+    year INT,
+    contract_id TEXT,
+    measure_id TEXT,
+    column_name TEXT,
+    value TEXT,
+    reason TEXT,
+    rejected_at TIMESTAMP DEFAULT now()
+);
+
+-- Staging tables are UNLOGGED: they are rebuilt from the raw CSVs on every load,
+-- so they skip WAL and keep raw CMS text (e.g. 'Not enough data available')
+CREATE UNLOGGED TABLE IF NOT EXISTS staging_summary_ratings (
+    contract_id TEXT,
+    organization_type TEXT,
+    contract_name TEXT,
+    marketing_name TEXT,
+    parent_organization TEXT,
+    snp_flag TEXT,
+    part_c_summary_star TEXT,
+    part_d_summary_star TEXT,
+    overall_star_rating TEXT,
+    year INT
+);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS staging_measure_stars (
     contract_id TEXT,
     organization_type TEXT,
     contract_name TEXT,
     marketing_name TEXT,
     parent_organization TEXT,
     snp_flag TEXT,
-    part_c_summary_star NUMERIC(2,1),
-    part_d_summary_star NUMERIC(2,1),
-    overall_star_rating NUMERIC(2,1),
     year INT
 );
 
-CREATE TABLE IF NOT EXISTS staging_measure_stars (
+CREATE UNLOGGED TABLE IF NOT EXISTS staging_measure_data (
     contract_id TEXT,
     organization_type TEXT,
     contract_name TEXT,
@@ -60,14 +166,14 @@ CREATE TABLE IF NOT EXISTS staging_measure_stars (
     year INT
 );
 
-CREATE TABLE IF NOT EXISTS staging_part_c_cutpoints (
+CREATE UNLOGGED TABLE IF NOT EXISTS staging_part_c_cutpoints (
     measure_id TEXT,
     star_level NUMERIC(2,1),
     cut_point NUMERIC(5,2),
     year INT
 );
 
-CREATE TABLE IF NOT EXISTS staging_part_d_cutpoints (
+CREATE UNLOGGED TABLE IF NOT EXISTS staging_part_d_cutpoints (
     measure_id TEXT,
     star_level NUMERIC(2,1),
     cut_point NUMERIC(5,2),
@@ -76,7 +182,15 @@ CREATE TABLE IF NOT EXISTS staging_part_d_cutpoints (
 
 
 
-CREATE INDEX IF NOT EXISTS idx_contracts_overall_rating ON contracts(overall_star_rating);
-CREATE INDEX IF NOT EXISTS idx_measure_scores_contract ON measure_scores(contract_id);
-CREATE INDEX IF NOT EXISTS idx_measure_scores_measure ON measure_scores(measure_id);
-CREATE INDEX IF NOT EXISTS idx_cut_points_lookup ON cut_points(measure_id, star_level);
\ No newline at end of file
+-- Indexes lead with year: single-year queries stay within one year's entries
+-- (and, on the partitioned tables, one partition). Indexes on a partitioned
+-- table are created on every partition.
+CREATE INDEX IF NOT EXISTS idx_contracts_overall_rating ON contracts(year, overall_star_rating);
+CREATE INDEX IF NOT EXISTS idx_measure_scores_measure ON measure_scores(year, measure_id);
+CREATE INDEX IF NOT EXISTS idx_measure_values_measure ON measure_values(year, measure_id);
+DROP INDEX IF EXISTS idx_facts_rating;
+CREATE INDEX IF NOT EXISTS idx_facts_year_rating ON contract_measure_facts(year, overall_star_rating, measure_id) WHERE score IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_facts_contract ON contract_measure_facts(contract_id, year);
+CREATE INDEX IF NOT EXISTS idx_rollup_year ON parent_org_rollup(year, grouping_id);
+CREATE INDEX IF NOT EXISTS idx_quality_report_stage ON data_quality_report(stage, year);
+CREATE INDEX IF NOT EXISTS idx_rejected_rows_stage ON rejected_rows(stage, year);
\ No newline at end of file
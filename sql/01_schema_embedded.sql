@@ -0,0 +1,123 @@
+-- Schema for the embedded DuckDB backend (DB_BACKEND=duckdb).
+-- Same tables as 01_schema.sql, without the Postgres-only parts: no UNLOGGED
+-- staging tables, year partitions, foreign keys or secondary indexes (DuckDB
+-- scans columns instead, skipping row groups of other years by their min/max
+-- year, and its indexes only slow down the upserts).
+
+CREATE TABLE IF NOT EXISTS contracts (
+    contract_id TEXT,
+    organization_type TEXT,
+    contract_name TEXT,
+    marketing_name TEXT,
+    parent_organization TEXT,
+    snp_flag TEXT,
+    part_c_summary_star NUMERIC(2,1),
+    part_d_summary_star NUMERIC(2,1),
+    overall_star_rating NUMERIC(2,1),
+    year INT,
+    PRIMARY KEY (year, contract_id)
+);
+
+CREATE TABLE IF NOT EXISTS measure_metadata (
+    measure_id TEXT PRIMARY KEY,
+    measure_name TEXT,
+    domain TEXT,
+    measure_type TEXT,
+    weight NUMERIC(3,1)
+);
+
+CREATE TABLE IF NOT EXISTS measure_scores (
+    contract_id TEXT,
+    measure_id TEXT,
+    score NUMERIC(3,1),
+    year INT,
+    PRIMARY KEY (year, contract_id, measure_id)
+);
+
+CREATE TABLE IF NOT EXISTS measure_values (
+    contract_id TEXT,
+    measure_id TEXT,
+    value NUMERIC(12,6),
+    unit TEXT,
+    year INT,
+    PRIMARY KEY (year, contract_id, measure_id)
+);
+
+CREATE TABLE IF NOT EXISTS contract_measure_facts (
+    year INT,
+    contract_id TEXT,
+    measure_id TEXT,
+    contract_name TEXT,
+    organization_type TEXT,
+    parent_organization TEXT,
+    snp_flag TEXT,
+    overall_star_rating NUMERIC(2,1),
+    part_c_summary_star NUMERIC(2,1),
+    part_d_summary_star NUMERIC(2,1),
+    bonus_status TEXT,
+    measure_name TEXT,
+    domain TEXT,
+    weight NUMERIC(3,1),
+    score NUMERIC(3,1),
+    PRIMARY KEY (year, contract_id, measure_id)
+);
+
+-- Parent organization x organization type x SNP x domain rollup of the facts
+-- per year, for the Power BI model. Built with GROUPING SETS: a NULL dimension
+-- with its grouping_id bit set means "all" (8 = parent_organization,
+-- 4 = organization_type, 2 = snp_flag, 1 = domain; 15 is the year total)
+CREATE TABLE IF NOT EXISTS parent_org_rollup (
+    year INT,
+    grouping_id INT,
+    parent_organization TEXT,
+    organization_type TEXT,
+    snp_flag TEXT,
+    domain TEXT,
+    contracts INT,
+    scored_measures INT,
+    weighted_avg_stars NUMERIC(3,2),
+    bonus_eligible_share NUMERIC(5,4),
+    near_bonus_contracts INT
+);
+
+CREATE TABLE IF NOT EXISTS cut_points (
+    measure_id TEXT,
+    star_level NUMERIC(2,1),
+    cut_point NUMERIC(12,6),
+    operator TEXT,
+    unit TEXT,
+    year INT,
+    PRIMARY KEY (year, measure_id, star_level)
+);
+
+CREATE TABLE IF NOT EXISTS etl_manifest (
+    stage TEXT,
+    year INT,
+    source_hash TEXT,
+    row_count INT,
+    updated_at TIMESTAMP DEFAULT now(),
+    PRIMARY KEY (stage, year)
+);
+
+CREATE TABLE IF NOT EXISTS data_quality_report (
+    stage TEXT,
+    year INT,
+    check_name TEXT,
+    column_name TEXT,
+    reason TEXT,
+    row_count INT,
+    checked_at TIMESTAMP DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS rejected_rows (
+    stage TEXT,
+    year INT,
+    contract_id TEXT,
+    measure_id TEXT,
+    column_name TEXT,
+    value TEXT,
+    reason TEXT,
+    rejected_at TIMESTAMP DEFAULT now()
+);
+
+-- Staging tables are replaced from the parsed DataFrames on every load
\ No newline at end of file
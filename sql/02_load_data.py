@@ -1,26 +1,198 @@
+import io
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
 import pandas as pd
-from sqlalchemy import create_engine
-
-# Database connection
-DB_CONFIG = {
-    'user': 'postgres',
-    'password': 'postgres',
-    'host': 'localhost',
-    'port': '5432',
-    'database': 'medicare_star_ratings'
+
+from db import dispose_engine, transaction
+from etl_manifest import get_stage_hashes, record_stage
+from instrumentation import get_logger, instrumented, record_rows, record_statements
+from raw_cache import file_hash, read_cached
+from validation import validate_release
+
+log = get_logger('load')
+
+# 'copy' streams frames with COPY FROM STDIN on Postgres (DuckDB scans the registered
+# DataFrame instead), 'to_sql' is the pandas INSERT fallback
+LOAD_METHOD = 'copy'
+
+# Reuse parsed CSVs from the Parquet cache (see raw_cache.py)
+USE_RAW_CACHE = True
+
+RAW_DIR = "data/raw"
+
+# "2024 Star Ratings Data Table - Summary Rating (Jul 2 2024).csv" -> year, table name
+RELEASE_FILE_PATTERN = re.compile(r'^(?P<year>\d{4}) Star Ratings Data Table - (?P<table>.+?) \(.*\)\.csv$')
+
+# Table name pattern in the release file names -> release table
+RELEASE_TABLES = {
+    'summary_ratings': r'Summary Ratings?',
+    'measure_stars': r'Measure Stars',
+    'measure_data': r'Measure Data',
+    'part_c_cutpoints': r'Part C Cut Points',
+    'part_d_cutpoints': r'Part D Cut Points',
 }
 
-def get_db_engine():
-    """Create SQLAlchemy engine for database connection"""
-    connection_string = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-    return create_engine(connection_string)
+# Release table -> staging table
+STAGING_TABLES = {
+    'summary_ratings': 'staging_summary_ratings',
+    'measure_stars': 'staging_measure_stars',
+    'measure_data': 'staging_measure_data',
+    'part_c_cutpoints': 'staging_part_c_cutpoints',
+    'part_d_cutpoints': 'staging_part_d_cutpoints',
+}
 
-def load_summary_ratings():
-    """Load Summary Rating data into staging table"""
-    print("Loading Summary Ratings...")
+# Postgres truncates identifiers to 63 bytes (NAMEDATALEN - 1)
+MAX_IDENTIFIER_BYTES = 63
+
+def quote_identifier(name):
+    """Double-quote a column or table name for use in raw SQL"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def pg_identifier(name):
+    """Return the name Postgres actually stores for an identifier"""
+    return str(name).encode('utf-8')[:MAX_IDENTIFIER_BYTES].decode('utf-8', errors='ignore')
+
+def year_list(years):
+    """SQL list of rating years, e.g. "(2024, 2025)" (ints only, so safe to inline)"""
+    return '(' + ', '.join(str(int(year)) for year in years) + ')'
+
+def copy_to_staging(frames, conn, years=None):
+    """Stream DataFrames into unlogged staging tables with COPY FROM STDIN.
+
+    frames maps staging table name -> DataFrame. Each table is truncated and
+    reused when its columns already match the frame, and only (re)created as
+    UNLOGGED TEXT columns when the layout changed. With `years`, only those
+    years' rows are replaced and the other years stay staged; columns new in
+    the frame are added. Everything runs inside the caller's transaction, so
+    a failed load leaves staging untouched.
+    Returns the load time in seconds per table.
+    """
+    timings = {}
+    with conn.connection.driver_connection.cursor() as cur:
+        for table_name, df in frames.items():
+            start = time.perf_counter()
+            columns = [pg_identifier(col) for col in df.columns]
+            
+            buffer = io.StringIO()
+            df.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            
+            cur.execute("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = %s
+                ORDER BY ordinal_position
+            """, (table_name,))
+            existing_columns = [row[0] for row in cur.fetchall()]
+            
+            if years is not None and existing_columns:
+                new_columns = [col for col in columns if col not in existing_columns]
+                for col in new_columns:
+                    cur.execute(f"ALTER TABLE {quote_identifier(table_name)} ADD COLUMN {quote_identifier(col)} TEXT")
+                cur.execute(f"DELETE FROM {quote_identifier(table_name)} WHERE year IN {year_list(years)}")
+                record_statements(2 + len(new_columns))
+            elif existing_columns == columns:
+                cur.execute(f"TRUNCATE {quote_identifier(table_name)}")
+                record_statements(2)
+            else:
+                column_defs = ', '.join(
+                    f"{quote_identifier(col)} {'INT' if col == 'year' else 'TEXT'}"
+                    for col in columns
+                )
+                cur.execute(f"DROP TABLE IF EXISTS {quote_identifier(table_name)}")
+                cur.execute(f"CREATE UNLOGGED TABLE {quote_identifier(table_name)} ({column_defs})")
+                record_statements(3)
+            
+            column_list = ', '.join(quote_identifier(col) for col in columns)
+            cur.copy_expert(f"COPY {quote_identifier(table_name)} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+            record_statements()
+            timings[table_name] = time.perf_counter() - start
+    return timings
+
+def register_to_staging(frames, conn, years=None):
+    """Rebuild DuckDB staging tables straight from the DataFrames (no CSV round trip).
+
+    With `years`, only those years' rows are replaced, as in copy_to_staging.
+    """
+    timings = {}
+    duckdb_conn = conn.connection.driver_connection
+    for table_name, df in frames.items():
+        start = time.perf_counter()
+        existing_columns = [row[0] for row in duckdb_conn.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = ?", [table_name]).fetchall()]
+        duckdb_conn.register('staging_frame', df)
+        try:
+            if years is not None and existing_columns:
+                for col in df.columns:
+                    if col not in existing_columns:
+                        duckdb_conn.execute(f"ALTER TABLE {quote_identifier(table_name)} ADD COLUMN {quote_identifier(col)} VARCHAR")
+                duckdb_conn.execute(f"DELETE FROM {quote_identifier(table_name)} WHERE year IN {year_list(years)}")
+                duckdb_conn.execute(f"INSERT INTO {quote_identifier(table_name)} BY NAME SELECT * FROM staging_frame")
+            else:
+                duckdb_conn.execute(f"CREATE OR REPLACE TABLE {quote_identifier(table_name)} AS SELECT * FROM staging_frame")
+        finally:
+            duckdb_conn.unregister('staging_frame')
+        record_statements()
+        timings[table_name] = time.perf_counter() - start
+    return timings
+
+def load_to_staging(frames, conn, method=None, years=None):
+    """Load {staging table: DataFrame} on one connection and report the load rate per table.
+
+    By default each staging table is replaced; with `years` only those years'
+    rows are, so staging keeps every loaded release.
+    """
+    method = method or LOAD_METHOD
+    if method == 'copy' and conn.dialect.name == 'duckdb':
+        method = 'register'
+    elif method == 'copy' and conn.dialect.name != 'postgresql':
+        method = 'to_sql'
     
-    file_path = "data/raw/2024 Star Ratings Data Table - (Jul 2 2024)_0/2024 Star Ratings Data Table - Summary Rating (Jul 2 2024).csv"
+    if method == 'copy':
+        timings = copy_to_staging(frames, conn, years)
+    elif method == 'register':
+        timings = register_to_staging(frames, conn, years)
+    else:
+        timings = {}
+        for table_name, df in frames.items():
+            start = time.perf_counter()
+            if years is not None and conn.dialect.has_table(conn, table_name):
+                conn.exec_driver_sql(f"DELETE FROM {quote_identifier(table_name)} WHERE year IN {year_list(years)}")
+                df.to_sql(table_name, conn, if_exists='append', index=False)
+            else:
+                df.to_sql(table_name, conn, if_exists='replace', index=False)
+            timings[table_name] = time.perf_counter() - start
     
+    for table_name, elapsed in timings.items():
+        rows = len(frames[table_name])
+        record_rows(rows_out=rows)
+        rows_per_second = rows / elapsed if elapsed > 0 else float('inf')
+        log.info(f"  {table_name}: {rows} rows via {method} in {elapsed:.2f}s ({rows_per_second:,.0f} rows/s)")
+    return timings
+
+def discover_releases(raw_dir=RAW_DIR):
+    """Find every Star Ratings release under raw_dir.
+
+    Returns {year: {table: file path}}. Files are matched by name, so both
+    "2024 ... Summary Rating (Jul 2 2024).csv" and
+    "2025 ... Summary Ratings (Dec 2 2024).csv" resolve to summary_ratings.
+    """
+    releases = {}
+    for file_path in sorted(Path(raw_dir).glob('*/*.csv')):
+        match = RELEASE_FILE_PATTERN.match(file_path.name)
+        if not match:
+            continue
+        year = int(match.group('year'))
+        for table, pattern in RELEASE_TABLES.items():
+            if re.fullmatch(pattern, match.group('table').strip()):
+                releases.setdefault(year, {})[table] = str(file_path)
+    return releases
+
+def read_summary_ratings(file_path, year):
+    """Parse a Summary Rating(s) CSV into the staging_summary_ratings layout"""
     # Skip the first row (title row) and use row 1 as header
     df = pd.read_csv(file_path, skiprows=1)
     
@@ -32,9 +204,9 @@ def load_summary_ratings():
         'Organization Marketing Name': 'marketing_name',
         'Parent Organization': 'parent_organization',
         'SNP': 'snp_flag',
-        '2024 Part C Summary': 'part_c_summary_star',
-        '2024 Part D Summary': 'part_d_summary_star',
-        '2024 Overall': 'overall_star_rating'
+        f'{year} Part C Summary': 'part_c_summary_star',
+        f'{year} Part D Summary': 'part_d_summary_star',
+        f'{year} Overall': 'overall_star_rating'
     })
     
     # Select only the columns we need
@@ -45,27 +217,13 @@ def load_summary_ratings():
     ]
     df = df[columns_to_keep]
     
-    df['year'] = 2024  # Add year column
-    
-    print(f"Loaded {len(df)} rows")
-    print(f"\nSample data:")
-    print(df.head())
-    
-    # Load to database
-    engine = get_db_engine()
-    df.to_sql('staging_summary_ratings', engine, if_exists='replace', index=False)
-    
-    print("\nSummary ratings loaded successfully!")
+    df['year'] = year  # Add year column
     return df
 
-def load_measure_stars():
-    """Load Measure Stars data into staging table"""
-    print("Loading Measure Stars...")
-    
-    file_path = "data/raw/2024 Star Ratings Data Table - (Jul 2 2024)_0/2024 Star Ratings Data Table - Measure Stars (Jul 2 2024).csv"
-    
-    # Read without headers first
-    df_raw = pd.read_csv(file_path, encoding='latin-1', header=None)
+def read_measure_stars(file_path, year):
+    """Parse a Measure Stars or Measure Data CSV (multi-row header) into a wide staging frame"""
+    # Read once without headers; cells stay text ("Not enough data available")
+    df_raw = pd.read_csv(file_path, encoding='latin-1', header=None, dtype=str)
     
     # Extract column names from multiple rows
     # Row 1 has contract info column names
@@ -86,62 +244,205 @@ def load_measure_stars():
         else:
             cleaned_columns.append(str(col))
     
-    # Now read the data starting from row 4 (index 4)
-    df = pd.read_csv(file_path, encoding='latin-1', skiprows=4, header=None)
+    # Data starts at row 4 (index 4)
+    df = df_raw.iloc[4:].reset_index(drop=True)
     
     # Assign cleaned column names
     df.columns = cleaned_columns
     
-    print(f"Loaded {len(df)} rows")
-    print(f"Total columns: {len(df.columns)}")
+    # Add year column
+    df['year'] = year
+    return df
+
+def read_cut_points(file_path, year):
+    """Parse a Part C or Part D Cut Points CSV, keeping its wide layout"""
+    df = pd.read_csv(file_path, skiprows=1, encoding='latin-1')
+    df['year'] = year
+    return df
+
+# Parser for each release table
+RELEASE_READERS = {
+    'summary_ratings': read_summary_ratings,
+    'measure_stars': read_measure_stars,
+    # Measure Data has the same layout, with raw rates instead of stars
+    'measure_data': read_measure_stars,
+    'part_c_cutpoints': read_cut_points,
+    'part_d_cutpoints': read_cut_points,
+}
+
+def read_release_table(table, file_path, year):
+    """Parse one release file, going through the Parquet cache when enabled"""
+    if USE_RAW_CACHE:
+        return read_cached(file_path, RELEASE_READERS[table], year)
+    return RELEASE_READERS[table](file_path, year)
+
+def parse_release(year, paths):
+    """Parse every table of one release; runs in a worker process"""
+    return year, {table: read_release_table(table, file_path, year) for table, file_path in paths.items()}
+
+def read_releases(table, years=None, raw_dir=RAW_DIR):
+    """Read one table from every discovered release (or only `years`) into one frame"""
+    releases = discover_releases(raw_dir)
+    frames = [
+        read_release_table(table, paths[table], year)
+        for year, paths in sorted(releases.items())
+        if table in paths and (years is None or year in years)
+    ]
+    if not frames:
+        raise FileNotFoundError(f"No {table} files found under {raw_dir}")
+    return pd.concat(frames, ignore_index=True)
+
+def release_hashes(releases):
+    """Content hash of every release file: {year: {table: sha256}}"""
+    return {
+        year: {table: file_hash(file_path) for table, file_path in paths.items()}
+        for year, paths in releases.items()
+    }
+
+def record_release_loads(conn, table, df, raw_dir=RAW_DIR):
+    """Record in the ETL manifest which file version of `table` was loaded per year"""
+    releases = discover_releases(raw_dir)
+    row_counts = df.groupby('year').size()
+    for year, row_count in row_counts.items():
+        source_hash = file_hash(releases[year][table])
+        record_stage(conn, f'load_{table}', year, source_hash, row_count)
+
+@instrumented('load_summary_ratings')
+def load_summary_ratings(years=None, raw_dir=RAW_DIR):
+    """Load Summary Rating data into staging table"""
+    log.info("Loading Summary Ratings...")
     
-    # Show first 10 column names
-    print(f"\nFirst 10 columns:")
-    for i, col in enumerate(df.columns[:10]):
-        print(f"{i}: '{col}'")
+    df = read_releases('summary_ratings', years, raw_dir)
+    record_rows(rows_in=len(df))
     
-    print(f"\nSample data:")
-    print(df.iloc[:3, :8])
+    log.info(f"Loaded {len(df)} rows for years {sorted(df['year'].unique().tolist())}")
     
-    # Add year column
-    df['year'] = 2024
+    # Validate and load in one transaction, so rejected data never reaches staging
+    with transaction() as conn:
+        df = validate_release(conn, 'summary_ratings', df)
+        load_to_staging({'staging_summary_ratings': df}, conn, years=years)
+        record_release_loads(conn, 'summary_ratings', df, raw_dir)
+    
+    log.info("Summary ratings loaded successfully!")
+    return df
+
+@instrumented('load_measure_stars')
+def load_measure_stars(years=None, raw_dir=RAW_DIR):
+    """Load Measure Stars data into staging table"""
+    log.info("Loading Measure Stars...")
+    
+    df = read_releases('measure_stars', years, raw_dir)
+    record_rows(rows_in=len(df))
+    
+    log.info(f"Loaded {len(df)} rows for years {sorted(df['year'].unique().tolist())}")
+    log.info(f"Total columns: {len(df.columns)}")
     
     # Load to database - keeping it wide for now in staging
-    engine = get_db_engine()
-    df.to_sql('staging_measure_stars', engine, if_exists='replace', index=False)
+    with transaction() as conn:
+        df = validate_release(conn, 'measure_stars', df)
+        load_to_staging({'staging_measure_stars': df}, conn, years=years)
+        record_release_loads(conn, 'measure_stars', df, raw_dir)
     
-    print("\nMeasure stars loaded successfully!")
+    log.info("Measure stars loaded successfully!")
     return df
 
-def load_cut_points():
+@instrumented('load_measure_data')
+def load_measure_data(years=None, raw_dir=RAW_DIR):
+    """Load Measure Data (raw measure rates) into staging table"""
+    log.info("Loading Measure Data...")
+    
+    df = read_releases('measure_data', years, raw_dir)
+    record_rows(rows_in=len(df))
+    log.info(f"Loaded {len(df)} rows for years {sorted(df['year'].unique().tolist())}")
+    
+    with transaction() as conn:
+        df = validate_release(conn, 'measure_data', df)
+        load_to_staging({'staging_measure_data': df}, conn, years=years)
+        record_release_loads(conn, 'measure_data', df, raw_dir)
+    
+    log.info("Measure data loaded successfully!")
+    return df
+
+@instrumented('load_cut_points')
+def load_cut_points(years=None, raw_dir=RAW_DIR):
     """Load Part C and Part D cut points"""
-    print("Loading Cut Points...")
-    
-    engine = get_db_engine()
-    
-    # Load Part C Cut Points
-    print("\n  Loading Part C Cut Points...")
-    part_c_file = "data/raw/2024 Star Ratings Data Table - (Jul 2 2024)_0/2024 Star Ratings Data Table - Part C Cut Points (Jul 2 2024).csv"
-    df_c = pd.read_csv(part_c_file, skiprows=1, encoding='latin-1')
-    df_c['year'] = 2024
-    print(f"  Part C columns: {df_c.columns.tolist()}")
-    print(f"  Part C sample:\n{df_c.head(3)}")
-    df_c.to_sql('staging_part_c_cutpoints', engine, if_exists='replace', index=False)
-    print(f"  Loaded {len(df_c)} Part C cut points")
-    
-    # Load Part D Cut Points
-    print("\n  Loading Part D Cut Points...")
-    part_d_file = "data/raw/2024 Star Ratings Data Table - (Jul 2 2024)_0/2024 Star Ratings Data Table - Part D Cut Points (Jul 2 2024).csv"
-    df_d = pd.read_csv(part_d_file, skiprows=1, encoding='latin-1')
-    df_d['year'] = 2024
-    print(f"  Part D columns: {df_d.columns.tolist()}")
-    print(f"  Part D sample:\n{df_d.head(3)}")
-    df_d.to_sql('staging_part_d_cutpoints', engine, if_exists='replace', index=False)
-    print(f"Loaded {len(df_d)} Part D cut points")
-    
-    print("\nCut points loaded successfully!")
+    log.info("Loading Cut Points...")
+    
+    df_c = read_releases('part_c_cutpoints', years, raw_dir)
+    df_d = read_releases('part_d_cutpoints', years, raw_dir)
+    log.info(f"  Part C: {len(df_c)} rows, Part D: {len(df_d)} rows")
+    record_rows(rows_in=len(df_c) + len(df_d))
+    
+    with transaction() as conn:
+        load_to_staging({
+            'staging_part_c_cutpoints': df_c,
+            'staging_part_d_cutpoints': df_d,
+        }, conn, years=years)
+        record_release_loads(conn, 'part_c_cutpoints', df_c, raw_dir)
+        record_release_loads(conn, 'part_d_cutpoints', df_d, raw_dir)
+    
+    log.info("Cut points loaded successfully!")
+
+@instrumented('load_all_releases')
+def load_all_releases(raw_dir=RAW_DIR, years=None, max_workers=None, incremental=True):
+    """Parse every discovered release in parallel and load all staging tables in one batch.
+
+    Each release (year) is parsed by its own worker process; the per-year
+    frames are then concatenated per table and loaded in a single transaction.
+    In incremental mode only releases whose files changed since the last
+    recorded load (see etl_manifest) are parsed and staged; the other years
+    stay in staging, so it always holds every loaded release.
+    """
+    releases = discover_releases(raw_dir)
+    if years is not None:
+        releases = {year: paths for year, paths in releases.items() if year in years}
+    if not releases:
+        raise FileNotFoundError(f"No Star Ratings releases found under {raw_dir}")
+    
+    hashes = release_hashes(releases)
+    
+    if incremental:
+        with transaction() as conn:
+            loaded = {table: get_stage_hashes(conn, f'load_{table}') for table in RELEASE_TABLES}
+        releases = {
+            year: paths for year, paths in releases.items()
+            if any(hashes[year][table] != loaded[table].get(year) for table in paths)
+        }
+        if not releases:
+            log.info("All releases are unchanged since the last load, nothing to do")
+            return {}
+    
+    log.info(f"Loading releases: {', '.join(str(year) for year in sorted(releases))}")
+    
+    start = time.perf_counter()
+    parsed = {}
+    # The forked workers must not inherit the parent's pooled connections
+    dispose_engine()
+    with ProcessPoolExecutor(max_workers=max_workers or len(releases)) as pool:
+        futures = [pool.submit(parse_release, year, paths) for year, paths in releases.items()]
+        for future in as_completed(futures):
+            year, frames = future.result()
+            parsed[year] = frames
+            record_rows(rows_in=sum(len(df) for df in frames.values()))
+            log.info(f"  Parsed {year}: {', '.join(f'{table} ({len(df)} rows)' for table, df in frames.items())}")
+    log.info(f"Parsed {len(parsed)} releases in {time.perf_counter() - start:.2f}s")
+    
+    # Validation results, staging and the manifest entries are committed together
+    with transaction() as conn:
+        staging_frames = {}
+        for table, staging_table in STAGING_TABLES.items():
+            frames = [parsed[year][table] for year in sorted(parsed) if table in parsed[year]]
+            if frames:
+                staging_frames[staging_table] = validate_release(conn, table, pd.concat(frames, ignore_index=True))
+        # A full load replaces staging; a partial one replaces only its years
+        full_load = years is None and not incremental
+        load_to_staging(staging_frames, conn, years=None if full_load else sorted(parsed))
+        for year, frames in parsed.items():
+            for table, df in frames.items():
+                record_stage(conn, f'load_{table}', year, hashes[year][table], len(df))
+    
+    log.info("All releases loaded successfully!")
+    return staging_frames
 
 if __name__ == "__main__":
-    load_summary_ratings()
-    load_measure_stars()
-    load_cut_points()
\ No newline at end of file
+    load_all_releases()
@@ -1,27 +1,49 @@
+import time
+
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 
-# Database connection
-DB_CONFIG = {
-    'user': 'postgres',
-    'password': 'postgres',
-    'host': 'localhost',
-    'port': '5432',
-    'database': 'medicare_star_ratings'
-}
+from db import affected_rows, pool_stats, transaction
+from etl_manifest import pending_years, record_stage
+from instrumentation import get_logger, instrumented, record_rows
+from partitions import ensure_year_partition
+from validation import record_transform_rejections, reject_orphans
 
-def get_db_engine():
-    """Create SQLAlchemy engine for database connection"""
-    connection_string = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-    return create_engine(connection_string)
+log = get_logger('transform')
 
-def transform_contracts():
-    """Transform staging_summary_ratings into contracts table"""
-    print("Transforming contracts...")
-    
-    engine = get_db_engine()
+# Unpivoted scores and values whose contract or measure is unknown are rejected
+# (reason, referenced table, join columns) instead of failing the foreign keys
+SCORE_REFERENCES = [
+    ('unknown_contract', 'contracts', ['year', 'contract_id']),
+    ('unknown_measure', 'measure_metadata', ['measure_id']),
+]
+
+def staged_years(conn, staging_table, years=None):
+    """Years currently present in a staging table, limited to `years` when given"""
+    result = conn.execute(text(f"SELECT DISTINCT year FROM {staging_table}"))
+    return [row[0] for row in result if years is None or row[0] in years]
+
+def staging_measure_columns(conn, staging_table='staging_measure_stars'):
+    """Measure columns ("C01: Breast Cancer Screening", ...) of a wide measure staging table"""
+    result = conn.execute(text("""
+        SELECT column_name 
+        FROM information_schema.columns 
+        WHERE table_name = :staging_table
+        AND column_name NOT IN ('CONTRACT_ID', 'Organization Type', 'Contract Name', 
+                               'Organization Marketing Name', 'Parent Organization', 
+                               'year')
+        AND column_name NOT LIKE 'unused_col_%'
+        ORDER BY ordinal_position;
+    """), {'staging_table': staging_table})
+    return [row[0] for row in result]
+
+@instrumented('transform_contracts')
+def transform_contracts(force=False, years=None):
+    """Upsert staging_summary_ratings into each year's contracts for years whose source changed"""
+    log.info("Transforming contracts...")
     
-    # Use SQL to insert from staging to production
+    # Every rating year keeps its own contract rows; only corrected values are rewritten.
+    # CMS pads IDs and names with trailing spaces, so they are trimmed once here
     query = text("""
         INSERT INTO contracts (
             contract_id, organization_type, contract_name, 
@@ -29,9 +51,9 @@ def transform_contracts():
             part_c_summary_star, part_d_summary_star, 
             overall_star_rating, year
         )
-        SELECT 
-            contract_id, organization_type, contract_name,
-            marketing_name, parent_organization, snp_flag,
+        SELECT DISTINCT ON (TRIM(contract_id))
+            TRIM(contract_id), TRIM(organization_type), TRIM(contract_name),
+            TRIM(marketing_name), TRIM(parent_organization), TRIM(snp_flag),
             CASE WHEN part_c_summary_star ~ '^[0-9.]+$' 
                  THEN part_c_summary_star::NUMERIC(2,1) 
                  ELSE NULL END as part_c_summary_star,
@@ -43,48 +65,79 @@ def transform_contracts():
                  ELSE NULL END as overall_star_rating,
             year
         FROM staging_summary_ratings
-        ON CONFLICT (contract_id) DO NOTHING;
+        WHERE year = :year
+        ORDER BY TRIM(contract_id)
+        ON CONFLICT (year, contract_id) DO UPDATE SET
+            organization_type = EXCLUDED.organization_type,
+            contract_name = EXCLUDED.contract_name,
+            marketing_name = EXCLUDED.marketing_name,
+            parent_organization = EXCLUDED.parent_organization,
+            snp_flag = EXCLUDED.snp_flag,
+            part_c_summary_star = EXCLUDED.part_c_summary_star,
+            part_d_summary_star = EXCLUDED.part_d_summary_star,
+            overall_star_rating = EXCLUDED.overall_star_rating
+        WHERE (contracts.organization_type, contracts.contract_name, contracts.marketing_name,
+               contracts.parent_organization, contracts.snp_flag, contracts.part_c_summary_star,
+               contracts.part_d_summary_star, contracts.overall_star_rating)
+            IS DISTINCT FROM
+            (EXCLUDED.organization_type, EXCLUDED.contract_name, EXCLUDED.marketing_name,
+             EXCLUDED.parent_organization, EXCLUDED.snp_flag, EXCLUDED.part_c_summary_star,
+             EXCLUDED.part_d_summary_star, EXCLUDED.overall_star_rating);
     """)
     
-    with engine.connect() as conn:
-        result = conn.execute(query)
-        conn.commit()
-        print(f"Inserted {result.rowcount} contracts")
-    
-    # Verify
-    with engine.connect() as conn:
-        count = conn.execute(text("SELECT COUNT(*) FROM contracts")).scalar()
-        print(f"Total contracts in production table: {count}")
+    with transaction() as conn:
+        pending = pending_years(conn, 'transform_contracts', ['load_summary_ratings'],
+                                staged_years(conn, 'staging_summary_ratings', years), force)
+        if not pending:
+            log.info("Contracts are up to date, skipping...")
+            return
+        
+        for year, source_hash in pending.items():
+            ensure_year_partition(conn, 'contracts', year)
+            changed = affected_rows(conn.execute(query, {'year': year}))
+            record_stage(conn, 'transform_contracts', year, source_hash, changed)
+            record_rows(rows_out=changed)
+            log.info(f"  {year}: upserted {changed} changed contracts")
 
-def transform_measure_metadata():
+@instrumented('transform_measure_metadata')
+def transform_measure_metadata(force=False):
     """Extract measure metadata from staging table columns"""
-    print("\nTransforming measure metadata...")
-    
-    engine = get_db_engine()
+    log.info("Transforming measure metadata...")
     
-    # Check if data already exists
-    with engine.connect() as conn:
-        existing_count = conn.execute(text("SELECT COUNT(*) FROM measure_metadata")).scalar()
-        if existing_count > 0:
-            print(f"Measure metadata already exists ({existing_count} records), skipping...")
+    with transaction() as conn:
+        pending = pending_years(conn, 'transform_measure_metadata', ['load_measure_stars'],
+                                staged_years(conn, 'staging_measure_stars'), force)
+        if not pending:
+            log.info("Measure metadata is up to date, skipping...")
             return
-    
-    # Get all measure columns from staging
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'staging_measure_stars'
-            AND column_name NOT IN ('CONTRACT_ID', 'Organization Type', 'Contract Name', 
-                                   'Organization Marketing Name', 'Parent Organization', 
-                                   'year')
-            AND column_name NOT LIKE 'unused_col_%'
-            ORDER BY ordinal_position;
-        """))
-        measure_columns = [row[0] for row in result]
-    
-    print(f"Found {len(measure_columns)} measures")
-    
+        
+        # Get all measure columns from staging
+        measure_columns = staging_measure_columns(conn)
+        log.info(f"Found {len(measure_columns)} measures")
+        
+        df = build_measure_metadata(measure_columns)
+        
+        # New measures are inserted, renamed ones updated; weights set by
+        # 05_update_weights.sql are left alone
+        upsert = text("""
+            INSERT INTO measure_metadata (measure_id, measure_name, domain, measure_type, weight)
+            VALUES (:measure_id, :measure_name, :domain, :measure_type, :weight)
+            ON CONFLICT (measure_id) DO UPDATE SET
+                measure_name = EXCLUDED.measure_name,
+                domain = EXCLUDED.domain,
+                measure_type = EXCLUDED.measure_type
+            WHERE (measure_metadata.measure_name, measure_metadata.domain, measure_metadata.measure_type)
+                IS DISTINCT FROM (EXCLUDED.measure_name, EXCLUDED.domain, EXCLUDED.measure_type)
+        """)
+        changed = sum(affected_rows(conn.execute(upsert, record)) for record in df.to_dict('records'))
+        record_rows(rows_in=len(df), rows_out=changed)
+        for year, source_hash in pending.items():
+            record_stage(conn, 'transform_measure_metadata', year, source_hash, changed)
+        
+        log.info(f"Upserted {changed} changed measure metadata records")
+
+def build_measure_metadata(measure_columns):
+    """Derive measure ID, name, domain and type from the staging column names"""
     # Build metadata records
     metadata_records = []
     for measure_col in measure_columns:
@@ -116,194 +169,411 @@ def transform_measure_metadata():
             'weight': 1.0  # Default weight, can be updated later
         })
     
-    # Convert to DataFrame and load
-    df = pd.DataFrame(metadata_records)
-    df.to_sql('measure_metadata', engine, if_exists='append', index=False)
-    
-    print(f"Inserted {len(df)} measure metadata records")
-    
-    # Verify
-    with engine.connect() as conn:
-        count = conn.execute(text("SELECT COUNT(*) FROM measure_metadata")).scalar()
-        print(f"Total measures in production table: {count}")
+    return pd.DataFrame(metadata_records).drop_duplicates(subset='measure_id')
 
-def transform_measure_scores():
+@instrumented('transform_measure_scores')
+def transform_measure_scores(force=False, years=None):
     """Transform wide measure_stars data into long format measure_scores"""
-    print("\nTransforming measure scores (wide → long)...")
-    
-    engine = get_db_engine()
-    
-    # First, get the measure column names from staging table
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'staging_measure_stars'
-            AND column_name NOT IN ('CONTRACT_ID', 'Organization Type', 'Contract Name', 
-                                   'Organization Marketing Name', 'Parent Organization', 
-                                   'year', 'unused_col_1', 'unused_col_2', 'unused_col_3')
-            AND column_name NOT LIKE 'unused_col_%'
-            ORDER BY ordinal_position;
-        """))
-        measure_columns = [row[0] for row in result]
-    
-    print(f"Found {len(measure_columns)} measure columns")
-    print(f"Sample measures: {measure_columns[:5]}")
+    log.info("Transforming measure scores (wide → long)...")
     
-    # Build dynamic UNPIVOT query
-    # For each measure column, create a UNION ALL clause
-    union_parts = []
+    with transaction() as conn:
+        pending = pending_years(conn, 'transform_measure_scores', ['load_measure_stars'],
+                                staged_years(conn, 'staging_measure_stars', years), force)
+        if not pending:
+            log.info("Measure scores are up to date, skipping...")
+            return
+        
+        # First, get the measure column names from staging table
+        measure_columns = staging_measure_columns(conn)
+        log.info(f"Found {len(measure_columns)} measure columns")
+        log.info(f"Sample measures: {measure_columns[:5]}")
+        
+        log.info("Executing unpivot transformation...")
+        source_sql = build_measure_scores_source(measure_columns)
+        for year, source_hash in pending.items():
+            source_rows, upserted, deleted, rejected = apply_delta(
+                conn, source_sql, 'measure_scores', ['contract_id', 'measure_id', 'year'], ['score'], year,
+                references=SCORE_REFERENCES
+            )
+            record_transform_rejections(conn, 'transform_measure_scores', year, source_rows, rejected)
+            record_stage(conn, 'transform_measure_scores', year, source_hash, upserted + deleted)
+            record_rows(rows_in=source_rows, rows_out=upserted + deleted)
+            log.info(f"  {year}: upserted {upserted} changed scores, deleted {deleted}")
+
+def unpivot_values_list(measure_columns):
+    """LATERAL VALUES rows pairing each measure ID with its staging column"""
+    value_rows = []
     for measure_col in measure_columns:
         # Extract measure ID (e.g., "C01" from "C01: Breast Cancer Screening")
         measure_id = measure_col.split(':')[0].strip() if ':' in measure_col else measure_col
-        
-        union_parts.append(f"""
-            SELECT 
-                "CONTRACT_ID" as contract_id,
-                '{measure_id}' as measure_id,
-                CASE 
-                    WHEN "{measure_col}" ~ '^[0-9.]+$' THEN "{measure_col}"::NUMERIC(3,1)
-                    ELSE NULL 
-                END as score,
-                year
-            FROM staging_measure_stars
-            WHERE "{measure_col}" IS NOT NULL 
-            AND "{measure_col}" != ''
-        """)
+        quoted_id = measure_id.replace("'", "''")
+        quoted_col = measure_col.replace('"', '""')
+        value_rows.append(f"""('{quoted_id}', s."{quoted_col}"::TEXT)""")
+    return ",\n                ".join(value_rows)
+
+def apply_delta(conn, source_sql, table, key_columns, value_columns, year, references=()):
+    """Make one year of `table` match source_sql: upsert changed rows, delete vanished ones.
+
+    The source rows are materialized in a temp table first, so the same
+    statements run on Postgres and on DuckDB (which has no data-modifying
+    CTEs), and rows failing `references` (see validation.reject_orphans) are
+    dropped from it, recorded with their first value column. key_columns must include year; the year's partition of
+    `table` is created if needed. Returns (source rows, upserted, deleted,
+    rejected rows).
+    """
+    columns = ', '.join(key_columns + value_columns)
+    ensure_year_partition(conn, table, year)
+    
+    created = affected_rows(conn.execute(text(f"CREATE TEMP TABLE delta_source AS {source_sql}"), {'year': year}))
+    rejected = reject_orphans(conn, 'delta_source', references, value_columns[0])
+    source_rows = created - len(rejected)
     
-    full_query = " UNION ALL ".join(union_parts)
+    upserted = affected_rows(conn.execute(text(f"""
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM delta_source
+        ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET
+            {', '.join(f'{col} = EXCLUDED.{col}' for col in value_columns)}
+        WHERE ({', '.join(f'{table}.{col}' for col in value_columns)})
+            IS DISTINCT FROM ({', '.join(f'EXCLUDED.{col}' for col in value_columns)})
+    """)))
+    deleted = affected_rows(conn.execute(text(f"""
+        DELETE FROM {table}
+        WHERE year = :year
+        AND NOT EXISTS (
+            SELECT 1 FROM delta_source src
+            WHERE {' AND '.join(f'src.{col} = {table}.{col}' for col in key_columns)}
+        )
+    """), {'year': year}))
     
-    insert_query = f"""
-        INSERT INTO measure_scores (contract_id, measure_id, score, year)
-        {full_query}
-        ON CONFLICT (contract_id, measure_id, year) DO NOTHING;
+    conn.execute(text("DROP TABLE delta_source"))
+    return source_rows, upserted, deleted, rejected
+
+def build_measure_scores_source(measure_columns):
+    """SQL that unpivots one staged Measure Stars year into measure_scores rows"""
+    # Unpivot in a single pass: each staging row is expanded into one
+    # (measure_id, raw_score) pair per measure column via a LATERAL VALUES list
+    values_list = unpivot_values_list(measure_columns)
+    
+    return f"""
+        SELECT 
+            TRIM(s."CONTRACT_ID") as contract_id,
+            v.measure_id,
+            CASE 
+                WHEN v.raw_score ~ '^[0-9.]+$' THEN v.raw_score::NUMERIC(3,1)
+                ELSE NULL 
+            END as score,
+            s.year
+        FROM staging_measure_stars s
+        CROSS JOIN LATERAL (
+            VALUES
+                {values_list}
+        ) AS v(measure_id, raw_score)
+        WHERE s.year = :year
+        AND v.raw_score IS NOT NULL 
+        AND v.raw_score != ''
     """
+
+@instrumented('transform_measure_values')
+def transform_measure_values(force=False, years=None):
+    """Transform wide Measure Data (raw rates) into long format measure_values"""
+    log.info("Transforming measure values (wide → long)...")
     
-    print("Executing unpivot transformation...")
-    with engine.connect() as conn:
-        result = conn.execute(text(insert_query))
-        conn.commit()
-        print(f"Inserted {result.rowcount} measure scores")
+    with transaction() as conn:
+        pending = pending_years(conn, 'transform_measure_values', ['load_measure_data'],
+                                staged_years(conn, 'staging_measure_data', years), force)
+        if not pending:
+            log.info("Measure values are up to date, skipping...")
+            return
+        
+        measure_columns = staging_measure_columns(conn, 'staging_measure_data')
+        log.info(f"Found {len(measure_columns)} measure columns")
+        
+        source_sql = build_measure_values_source(measure_columns)
+        for year, source_hash in pending.items():
+            source_rows, upserted, deleted, rejected = apply_delta(
+                conn, source_sql, 'measure_values', ['contract_id', 'measure_id', 'year'], ['value', 'unit'], year,
+                references=SCORE_REFERENCES
+            )
+            record_transform_rejections(conn, 'transform_measure_values', year, source_rows, rejected)
+            record_stage(conn, 'transform_measure_values', year, source_hash, upserted + deleted)
+            record_rows(rows_in=source_rows, rows_out=upserted + deleted)
+            log.info(f"  {year}: upserted {upserted} changed values, deleted {deleted}")
+
+def build_measure_values_source(measure_columns):
+    """SQL that unpivots one staged Measure Data year into measure_values rows"""
+    values_list = unpivot_values_list(measure_columns)
     
-    # Verify
-    with engine.connect() as conn:
-        count = conn.execute(text("SELECT COUNT(*) FROM measure_scores")).scalar()
-        print(f"Total measure scores in production table: {count}")
+    # "86%" -> 86 with unit '%', "0.83" -> 0.83; status text such as
+    # "Plan too small to be measured" becomes NULL like in measure_scores
+    return f"""
+        SELECT 
+            contract_id,
+            measure_id,
+            CASE 
+                WHEN raw_value ~ '^-?[0-9]+([.][0-9]+)? *%?$' 
+                THEN RTRIM(raw_value, ' %')::NUMERIC(12,6)
+                ELSE NULL 
+            END as value,
+            CASE WHEN raw_value ~ '^-?[0-9.]+ *%$' THEN '%' END as unit,
+            year
+        FROM (
+            SELECT 
+                TRIM(s."CONTRACT_ID") as contract_id,
+                v.measure_id,
+                TRIM(v.raw_value) as raw_value,
+                s.year
+            FROM staging_measure_data s
+            CROSS JOIN LATERAL (
+                VALUES
+                    {values_list}
+            ) AS v(measure_id, raw_value)
+            WHERE s.year = :year
+            AND v.raw_value IS NOT NULL 
+            AND v.raw_value != ''
+        ) raw
+    """
 
-def transform_cut_points():
-    """Transform cut points from staging to production"""
-    print("\nTransforming cut points...")
+# Column holding the "1star" ... "5star" row labels in both cut-point files
+STAR_LABEL_COLUMN = 'Number of Stars Displayed on the Plan Finder Tool'
+
+# Matches "< 48 %", ">= 48 % to < 63 %", "> 0.83 to <= 1.46", "100%", "< -0.179809"
+THRESHOLD_PATTERN = (
+    r'^\s*(?P<low_op>[<>]=?)?\s*(?P<low>-?\d+(?:\.\d+)?)\s*(?P<unit>%)?'
+    r'(?:\s*to\s*(?P<high_op>[<>]=?)\s*(?P<high>-?\d+(?:\.\d+)?)\s*%?)?'
+)
+
+def extract_cut_points(df):
+    """Melt a wide Part C or Part D cut-point staging frame into long cut points.
+
+    Returns one row per measure, star level, org type and year with the
+    threshold that qualifies for that star level and its operator, e.g.
+    ">= 48 % to < 63 %" becomes cut_point 48, operator '>=', unit '%'.
+    """
+    id_columns = [col for col in (STAR_LABEL_COLUMN, 'Org Type', 'year') if col in df.columns]
+    measure_columns = [col for col in df.columns if col not in id_columns]
     
-    engine = get_db_engine()
+    long = df.melt(id_vars=id_columns, value_vars=measure_columns,
+                   var_name='column', value_name='cell')
+    long['cell'] = long['cell'].astype('string').str.strip()
     
-    # Check if data already exists
-    with engine.connect() as conn:
-        existing_count = conn.execute(text("SELECT COUNT(*) FROM cut_points")).scalar()
-        if existing_count > 0:
-            print(f"Cut points already exist ({existing_count} records), skipping...")
-            return
+    # Header rows hold "C01: Breast Cancer Screening" under each column
+    measure_ids = long['cell'].str.extract(r'^([A-Z]\d+)\s*:', expand=False)
+    column_measures = (
+        long.assign(measure_id=measure_ids)
+        .dropna(subset=['measure_id'])
+        .drop_duplicates(subset=['year', 'column'])[['year', 'column', 'measure_id']]
+    )
     
-    # Load staging data
-    df_c = pd.read_sql("SELECT * FROM staging_part_c_cutpoints", engine)
-    df_d = pd.read_sql("SELECT * FROM staging_part_d_cutpoints", engine)
+    # Star rows are labelled "1star" ... "5star"
+    star_levels = (
+        long[STAR_LABEL_COLUMN].astype('string').str.strip().str.lower()
+        .str.extract(r'^(\d+(?:\.\d+)?)\s*star', expand=False)
+        .astype('Float64')
+    )
+    thresholds = long.assign(star_level=star_levels).dropna(subset=['star_level', 'cell'])
+    thresholds = thresholds.merge(column_measures, on=['year', 'column'])
     
-    measure_cols_c = [col for col in df_c.columns if col not in ['Number of Stars Displayed on the Plan Finder Tool', 'year'] and not col.startswith('Unnamed')]
-    measure_cols_d = [col for col in df_d.columns if col not in ['Org Type', 'Number of Stars Displayed on the Plan Finder Tool', 'year'] and not col.startswith('Unnamed')]
+    parsed = thresholds['cell'].str.extract(THRESHOLD_PATTERN)
     
-    print(f"  Found {len(measure_cols_c)} Part C measures with cut points")
-    print(f"  Found {len(measure_cols_d)} Part D measures with cut points")
+    # The inclusive bound of a range is the one that qualifies for the star level:
+    # the lower bound when higher is better (">= 48 % to < 63 %"),
+    # the upper bound when lower is better ("> 11 % to <= 13 %")
+    use_high = parsed['high'].notna() & parsed['high_op'].str.contains('=', regex=False).fillna(False)
+    cut_point = parsed['low'].where(~use_high, parsed['high']).astype('Float64')
+    operator = parsed['low_op'].where(~use_high, parsed['high_op']).fillna('=')
     
-    # Transform Part C
-    cut_point_records = []
-    for col in measure_cols_c:
-        # Extract measure ID
-        measure_id = col.split(':')[0].strip() if ':' in col else col
-        
-        # Skip first 2 rows (headers), process star level rows
-        for idx in range(2, len(df_c)):
-            star_label = df_c.iloc[idx, 0]  # First column has star labels
-            if pd.notna(star_label) and 'star' in str(star_label).lower():
-                # Extract numeric star level (e.g., "1star" -> 1.0, "2star" -> 2.0)
-                star_num = star_label.strip().lower().replace('star', '').replace(' ', '')
-                if star_num:
-                    try:
-                        star_level = float(star_num)
-                    except:
-                        continue
-                    
-                    # Get cut point value
-                    cut_val = df_c[col].iloc[idx]
-                    if pd.notna(cut_val) and str(cut_val).strip():
-                        # Clean the cut point value (remove %, <, >, etc.)
-                        cut_str = str(cut_val).strip().replace('%', '').replace('<', '').replace('>', '').replace(' ', '')
-                        try:
-                            cut_point = float(cut_str)
-                            cut_point_records.append({
-                                'measure_id': measure_id,
-                                'star_level': star_level,
-                                'cut_point': cut_point,
-                                'year': 2024
-                            })
-                        except:
-                            pass
+    org_type = (thresholds['Org Type'].astype('string').str.strip()
+                if 'Org Type' in thresholds.columns else pd.NA)
+    
+    result = pd.DataFrame({
+        'measure_id': thresholds['measure_id'],
+        'star_level': thresholds['star_level'],
+        'cut_point': cut_point,
+        'operator': operator,
+        'unit': parsed['unit'],
+        'org_type': org_type,
+        'year': thresholds['year'].astype(int),
+    })
+    return result.dropna(subset=['cut_point'])
+
+@instrumented('transform_cut_points')
+def transform_cut_points(force=False, years=None):
+    """Transform cut points from staging to production"""
+    log.info("Transforming cut points...")
     
-    # Transform Part D (same logic)
-    for col in measure_cols_d:
-        measure_id = col.split(':')[0].strip() if ':' in col else col
+    with transaction() as conn:
+        pending = pending_years(conn, 'transform_cut_points',
+                                ['load_part_c_cutpoints', 'load_part_d_cutpoints'],
+                                staged_years(conn, 'staging_part_c_cutpoints', years), force)
+        if not pending:
+            log.info("Cut points are up to date, skipping...")
+            return
+        
+        # Load staging data
+        df_c = pd.read_sql("SELECT * FROM staging_part_c_cutpoints", conn)
+        df_d = pd.read_sql("SELECT * FROM staging_part_d_cutpoints", conn)
+        measures = pd.read_sql("SELECT measure_id FROM measure_metadata", conn)
+        
+        start = time.perf_counter()
+        df_cut = pd.concat([extract_cut_points(df_c), extract_cut_points(df_d)], ignore_index=True)
+        df_cut = df_cut[df_cut['year'].isin(list(pending))]
+        log.info(f"  Parsed {len(df_cut)} cut points for {df_cut['measure_id'].nunique()} measures "
+              f"across years {sorted(df_cut['year'].unique().tolist())}")
+        
+        # Keep only measures that exist in measure_metadata
+        df_cut = df_cut.merge(measures, on='measure_id')
+        log.info(f"  Filtered to {len(df_cut)} valid cut points (matching existing measures)")
+        record_rows(rows_in=len(df_cut))
+        
+        # Part D publishes MA-PD and PDP thresholds; the MA-PD ones are kept
+        df_cut = (
+            df_cut.sort_values('org_type', key=lambda s: s.ne('MA-PD'), kind='stable')
+            .drop_duplicates(subset=['measure_id', 'star_level', 'year'])
+            .drop(columns='org_type')
+        )
+        log.info(f"  Extracted cut points in {(time.perf_counter() - start) * 1000:.1f} ms")
+        
+        # Stage the parsed cut points in a temp table, then diff each year against cut_points
+        records = df_cut.astype(object).where(df_cut.notna(), None).to_dict('records')
+        conn.execute(text("""
+            CREATE TEMP TABLE new_cut_points AS
+            SELECT measure_id, star_level, cut_point, operator, unit, year FROM cut_points WHERE 1 = 0
+        """))
+        if records:
+            conn.execute(text("""
+                INSERT INTO new_cut_points (measure_id, star_level, cut_point, operator, unit, year)
+                VALUES (:measure_id, :star_level, :cut_point, :operator, :unit, :year)
+            """), records)
         
-        for idx in range(2, len(df_d)):
-            star_label = df_d.iloc[idx, 1]  #Second column has star labels for Part D
-            if pd.notna(star_label) and 'star' in str(star_label).lower():
-                star_num = star_label.strip().lower().replace('star', '').replace(' ', '')
-                if star_num:
-                    try:
-                        star_level = float(star_num)
-                    except:
-                        continue
-                    
-                    cut_val = df_d[col].iloc[idx]
-                    if pd.notna(cut_val) and str(cut_val).strip():
-                        cut_str = str(cut_val).strip().replace('%', '').replace('<', '').replace('>', '').replace(' ', '')
-                        try:
-                            cut_point = float(cut_str)
-                            cut_point_records.append({
-                                'measure_id': measure_id,
-                                'star_level': star_level,
-                                'cut_point': cut_point,
-                                'year': 2024
-                            })
-                        except:
-                            pass
+        for year, source_hash in pending.items():
+            _, upserted, deleted, _ = apply_delta(
+                conn, "SELECT * FROM new_cut_points WHERE year = :year", 'cut_points',
+                ['measure_id', 'star_level', 'year'], ['cut_point', 'operator', 'unit'], year
+            )
+            record_stage(conn, 'transform_cut_points', year, source_hash, upserted + deleted)
+            record_rows(rows_out=upserted + deleted)
+            log.info(f"  {year}: upserted {upserted} changed cut points, deleted {deleted}")
+        
+        conn.execute(text("DROP TABLE new_cut_points"))
+
+@instrumented('build_contract_measure_facts')
+def build_contract_measure_facts(force=False, years=None):
+    """Refresh contract_measure_facts for years whose contracts or scores changed.
+
+    The fact table joins measure_scores to contracts and measure_metadata once,
+    so the exports and analysis queries read one indexed table instead of
+    re-joining (and re-trimming) on every run. Each changed year is replaced
+    as a whole.
+    """
+    log.info("Building contract x measure facts...")
     
-    # Get valid measure IDs from metadata
-    with engine.connect() as conn:
-        valid_measures = conn.execute(text("SELECT measure_id FROM measure_metadata")).fetchall()
-        valid_measure_ids = [row[0] for row in valid_measures]
+    refresh = text("""
+        INSERT INTO contract_measure_facts (
+            year, contract_id, measure_id,
+            contract_name, organization_type, parent_organization, snp_flag,
+            overall_star_rating, part_c_summary_star, part_d_summary_star, bonus_status,
+            measure_name, domain, weight, score
+        )
+        SELECT 
+            ms.year, ms.contract_id, ms.measure_id,
+            c.contract_name, c.organization_type, c.parent_organization, c.snp_flag,
+            c.overall_star_rating, c.part_c_summary_star, c.part_d_summary_star,
+            CASE 
+                WHEN c.overall_star_rating IS NULL THEN NULL
+                WHEN c.overall_star_rating >= 4.0 THEN 'Bonus Eligible'
+                WHEN c.overall_star_rating = 3.5 THEN 'Near Bonus'
+                ELSE 'Below Threshold'
+            END as bonus_status,
+            mm.measure_name, mm.domain, mm.weight, ms.score
+        FROM measure_scores ms
+        JOIN contracts c ON c.contract_id = ms.contract_id AND c.year = ms.year
+        JOIN measure_metadata mm ON mm.measure_id = ms.measure_id
+        WHERE ms.year = :year
+    """)
     
-    if cut_point_records:
-        df_cut = pd.DataFrame(cut_point_records)
-        
-        # Filter to only keep cut points for measures that exist in measure_metadata
-        df_cut = df_cut[df_cut['measure_id'].isin(valid_measure_ids)]
-        print(f"  Filtered to {len(df_cut)} valid cut points (matching existing measures)")
+    with transaction() as conn:
+        # Keyed on the transforms the facts read, not on the loads: a year is
+        # rebuilt only once its contracts, scores and metadata were transformed
+        pending = pending_years(conn, 'build_contract_measure_facts',
+                                ['transform_contracts', 'transform_measure_scores', 'transform_measure_metadata'],
+                                staged_years(conn, 'measure_scores', years), force)
+        if not pending:
+            log.info("Contract x measure facts are up to date, skipping...")
+            return
         
-        # Remove duplicates before inserting
-        df_cut = df_cut.drop_duplicates(subset=['measure_id', 'star_level', 'year'])
+        for year, source_hash in pending.items():
+            conn.execute(text("DELETE FROM contract_measure_facts WHERE year = :year"), {'year': year})
+            facts = affected_rows(conn.execute(refresh, {'year': year}))
+            record_stage(conn, 'build_contract_measure_facts', year, source_hash, facts)
+            record_rows(rows_out=facts)
+            log.info(f"  {year}: {facts} facts")
         
-        if len(df_cut) > 0:
-            df_cut.to_sql('cut_points', engine, if_exists='append', index=False)
-            print(f"Inserted {len(df_cut)} cut point records")
-        else:
-            print("No valid cut points after filtering")
-    else:
-        print("No cut points extracted")
+        conn.execute(text("ANALYZE contract_measure_facts"))
+
+@instrumented('build_parent_org_rollup')
+def build_parent_org_rollup(force=False, years=None):
+    """Refresh parent_org_rollup for years whose contract x measure facts changed.
+
+    Each changed year is aggregated in one GROUPING SETS pass over its
+    facts: parent organization x organization type x SNP x domain and the
+    coarser levels the dashboard slices by. Contract counts
+    are distinct, so a contract scored in both domains counts once in its
+    parent's total; stars are averaged by measure weight.
+    """
+    log.info("Building parent organization rollup...")
     
-    with engine.connect() as conn:
-        count = conn.execute(text("SELECT COUNT(*) FROM cut_points")).scalar()
-        print(f"Total cut points in production table: {count}")
+    refresh = text("""
+        INSERT INTO parent_org_rollup (
+            year, grouping_id, parent_organization, organization_type, snp_flag, domain,
+            contracts, scored_measures, weighted_avg_stars, bonus_eligible_share, near_bonus_contracts
+        )
+        SELECT
+            year,
+            GROUPING(parent_organization, organization_type, snp_flag, domain) as grouping_id,
+            parent_organization, organization_type, snp_flag, domain,
+            COUNT(DISTINCT contract_id) as contracts,
+            COUNT(score) as scored_measures,
+            ROUND(SUM(score * weight) / NULLIF(SUM(weight) FILTER (WHERE score IS NOT NULL), 0), 2)
+                as weighted_avg_stars,
+            ROUND(CAST(COUNT(DISTINCT contract_id) FILTER (WHERE overall_star_rating >= 4.0) AS NUMERIC)
+                  / NULLIF(COUNT(DISTINCT contract_id) FILTER (WHERE overall_star_rating IS NOT NULL), 0), 4)
+                as bonus_eligible_share,
+            COUNT(DISTINCT contract_id) FILTER (WHERE overall_star_rating = 3.5) as near_bonus_contracts
+        FROM contract_measure_facts
+        WHERE year = :year
+        GROUP BY year, GROUPING SETS (
+            (parent_organization, organization_type, snp_flag, domain),
+            (parent_organization, domain),
+            (parent_organization),
+            (organization_type, snp_flag, domain),
+            (organization_type, snp_flag),
+            (organization_type),
+            (snp_flag),
+            (domain),
+            ()
+        )
+    """)
+    
+    with transaction() as conn:
+        pending = pending_years(conn, 'build_parent_org_rollup', ['build_contract_measure_facts'],
+                                staged_years(conn, 'contract_measure_facts', years), force)
+        if not pending:
+            log.info("Parent organization rollup is up to date, skipping...")
+            return
+        
+        for year, source_hash in pending.items():
+            conn.execute(text("DELETE FROM parent_org_rollup WHERE year = :year"), {'year': year})
+            rows = affected_rows(conn.execute(refresh, {'year': year}))
+            record_stage(conn, 'build_parent_org_rollup', year, source_hash, rows)
+            record_rows(rows_out=rows)
+            log.info(f"  {year}: {rows} rollup rows")
 
 if __name__ == "__main__":
     transform_contracts()
     transform_measure_metadata()
     transform_measure_scores()
-    transform_cut_points()
\ No newline at end of file
+    transform_measure_values()
+    transform_cut_points()
+    build_contract_measure_facts()
+    build_parent_org_rollup()
+    log.info(f"Connection pool: {pool_stats()}")
\ No newline at end of file
@@ -1,23 +1,32 @@
--- Data quality checks to run after ETL
+-- Data quality summary. The checks run inside the load and transform stages
+-- (see validation.py) and write their results in the same transaction as the
+-- data, so this only reads those results instead of rescanning the tables
 
--- Check for contracts with no overall rating
-SELECT COUNT(*) as contracts_missing_rating 
-FROM contracts 
-WHERE overall_star_rating IS NULL;
+-- Ratings and measure cells without a numeric value, by reason
+SELECT stage, year, reason, SUM(row_count) as cells
+FROM data_quality_report
+WHERE check_name = 'non_numeric'
+GROUP BY stage, year, reason
+ORDER BY stage, year, cells DESC;
 
--- Check for orphaned measure scores (measures without metadata)
-SELECT COUNT(*) as orphaned_scores
-FROM measure_scores ms
-LEFT JOIN measure_metadata mm ON ms.measure_id = mm.measure_id
-WHERE mm.measure_id IS NULL;
+-- Contracts missing an overall rating
+SELECT year, reason, row_count as contracts_missing_rating
+FROM data_quality_report
+WHERE stage = 'load_summary_ratings'
+  AND column_name = 'overall_star_rating'
+  AND check_name = 'non_numeric'
+ORDER BY year, reason;
 
--- Verify expected record counts
-SELECT 
-    'contracts' as table_name, COUNT(*) as record_count 
-FROM contracts
-UNION ALL
-SELECT 'measure_metadata', COUNT(*) FROM measure_metadata
-UNION ALL
-SELECT 'measure_scores', COUNT(*) FROM measure_scores
-UNION ALL
-SELECT 'cut_points', COUNT(*) FROM cut_points;
\ No newline at end of file
+-- Rejected rows and cells (duplicate or missing keys, out-of-range stars,
+-- scores of unknown contracts or measures)
+SELECT stage, year, reason, COUNT(*) as rejected
+FROM rejected_rows
+GROUP BY stage, year, reason
+ORDER BY stage, year, reason;
+
+-- Rows checked and written per stage and year
+SELECT q.stage, q.year, q.row_count as rows_checked, m.row_count as rows_written
+FROM data_quality_report q
+LEFT JOIN etl_manifest m ON m.stage = q.stage AND m.year = q.year
+WHERE q.check_name = 'rows'
+ORDER BY q.stage, q.year;
\ No newline at end of file
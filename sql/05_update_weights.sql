@@ -7,4 +7,21 @@ WHERE measure_id IN ('C09', 'C10', 'C11', 'C15', 'C16', 'D08', 'D09', 'D10');
 
 -- Weight = 1.5 or 4 for CAHPS (patient experience)
 UPDATE measure_metadata SET weight = 1.5
-WHERE measure_id IN ('C19', 'C20', 'C21', 'C22', 'C23', 'C24');
\ No newline at end of file
+WHERE measure_id IN ('C19', 'C20', 'C21', 'C22', 'C23', 'C24');
+
+-- The parent organization rollup averages stars by weight: forget the years
+-- whose facts are about to change weight, so build_parent_org_rollup rebuilds them
+DELETE FROM etl_manifest
+WHERE stage = 'build_parent_org_rollup'
+  AND year IN (
+      SELECT DISTINCT f.year
+      FROM contract_measure_facts f
+      JOIN measure_metadata mm ON mm.measure_id = f.measure_id
+      WHERE f.weight IS DISTINCT FROM mm.weight
+  );
+
+-- Carry the weights into the denormalized fact table
+UPDATE contract_measure_facts f SET weight = mm.weight
+FROM measure_metadata mm
+WHERE f.measure_id = mm.measure_id
+  AND f.weight IS DISTINCT FROM mm.weight;
\ No newline at end of file
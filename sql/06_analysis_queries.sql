@@ -1,45 +1,46 @@
 
+-- Queries 1-4 look at the latest rating year
+
 -- QUERY 1: Find all 3.5-star plans 
 SELECT 
     contract_id,
     contract_name,
     overall_star_rating
 FROM contracts
-WHERE overall_star_rating = 3.5
+WHERE year = (SELECT MAX(year) FROM contracts)
+  AND overall_star_rating = 3.5
 ORDER BY contract_name;
 
 -- QUERY 2: Show worst performing measures for 3.5-star plans
 SELECT 
-    c.contract_id,
-    c.contract_name,
-    ms.measure_id,
-    mm.measure_name,
-    ms.score,
-    mm.weight
-FROM contracts c
-JOIN measure_scores ms ON c.contract_id = ms.contract_id
-JOIN measure_metadata mm ON ms.measure_id = mm.measure_id
-WHERE c.overall_star_rating = 3.5
-  AND ms.score IS NOT NULL
-  AND ms.score < 4.0
-ORDER BY c.contract_id, mm.weight DESC, ms.score ASC
+    contract_id,
+    contract_name,
+    measure_id,
+    measure_name,
+    score,
+    weight
+FROM contract_measure_facts
+WHERE year = (SELECT MAX(year) FROM contract_measure_facts)
+  AND overall_star_rating = 3.5
+  AND score IS NOT NULL
+  AND score < 4.0
+ORDER BY contract_id, weight DESC, score ASC
 LIMIT 50;
 
 -- QUERY 3: Prioritization Matrix
 WITH plan_opportunities AS (
     SELECT 
-        ms.measure_id,
-        mm.measure_name,
-        mm.weight,
-        AVG(ms.score) as avg_score,
+        measure_id,
+        measure_name,
+        weight,
+        AVG(score) as avg_score,
         COUNT(*) as num_plans_struggling
-    FROM measure_scores ms
-    JOIN measure_metadata mm ON ms.measure_id = mm.measure_id
-    JOIN contracts c ON ms.contract_id = c.contract_id
-    WHERE c.overall_star_rating = 3.5
-      AND ms.score IS NOT NULL
-      AND ms.score < 4.0
-    GROUP BY ms.measure_id, mm.measure_name, mm.weight
+    FROM contract_measure_facts
+    WHERE year = (SELECT MAX(year) FROM contract_measure_facts)
+      AND overall_star_rating = 3.5
+      AND score IS NOT NULL
+      AND score < 4.0
+    GROUP BY measure_id, measure_name, weight
 )
 SELECT 
     measure_id,
@@ -54,44 +55,62 @@ LIMIT 20;
 
 -- QUERY 4: Specific plan recommendation (Arizona Physicians IPA)
 SELECT 
-    c.contract_name,
-    ms.measure_id,
-    mm.measure_name,
-    ms.score as current_score,
-    mm.weight,
-    ROUND(mm.weight * (4.0 - ms.score), 2) as impact_if_improved_to_4,
+    contract_name,
+    measure_id,
+    measure_name,
+    score as current_score,
+    weight,
+    ROUND(weight * (4.0 - score), 2) as impact_if_improved_to_4,
     CASE 
-        WHEN ms.score <= 2.0 THEN 'CRITICAL'
-        WHEN ms.score < 4.0 THEN 'HIGH'
+        WHEN score <= 2.0 THEN 'CRITICAL'
+        WHEN score < 4.0 THEN 'HIGH'
         ELSE 'MEDIUM'
     END as priority
-FROM contracts c
-JOIN measure_scores ms ON c.contract_id = ms.contract_id
-JOIN measure_metadata mm ON ms.measure_id = mm.measure_id
-WHERE c.contract_id = 'H0107'  -- Health Care Service Corporation
-  AND ms.score IS NOT NULL
-  AND ms.score < 4.0
+FROM contract_measure_facts
+WHERE contract_id = 'H0107'  -- Health Care Service Corporation
+  AND year = (SELECT MAX(year) FROM contract_measure_facts)
+  AND score IS NOT NULL
+  AND score < 4.0
 ORDER BY impact_if_improved_to_4 DESC
 LIMIT 10;
 
 SELECT 
-    c.contract_name,
-    ms.measure_id,
-    mm.measure_name,
-    ms.score as current_score,
-    mm.weight,
-    ROUND(mm.weight * (4.0 - ms.score), 2) as impact_if_improved_to_4,
+    contract_name,
+    measure_id,
+    measure_name,
+    score as current_score,
+    weight,
+    ROUND(weight * (4.0 - score), 2) as impact_if_improved_to_4,
     CASE 
-        WHEN ms.score <= 2.0 THEN 'CRITICAL - Immediate action needed'
-        WHEN ms.score < 3.0 THEN 'HIGH - Major improvement opportunity'
-        WHEN ms.score < 4.0 THEN 'MEDIUM - Incremental gains'
+        WHEN score <= 2.0 THEN 'CRITICAL - Immediate action needed'
+        WHEN score < 3.0 THEN 'HIGH - Major improvement opportunity'
+        WHEN score < 4.0 THEN 'MEDIUM - Incremental gains'
         ELSE 'LOW - Already strong'
     END as priority
-FROM contracts c
-JOIN measure_scores ms ON c.contract_id = ms.contract_id
-LEFT JOIN measure_metadata mm ON ms.measure_id = mm.measure_id
-WHERE TRIM(c.contract_id) = 'H0907'
-  AND ms.score IS NOT NULL
-  AND ms.score < 4.0
+FROM contract_measure_facts
+WHERE contract_id = 'H0907'
+  AND year = (SELECT MAX(year) FROM contract_measure_facts)
+  AND score IS NOT NULL
+  AND score < 4.0
 ORDER BY impact_if_improved_to_4 DESC
 LIMIT 10;
+
+
+-- QUERY 5: Year-over-year star movement per measure, latest year vs the year
+-- before (trends.py has the parameterized version)
+SELECT 
+    cur.measure_id,
+    COUNT(*) FILTER (WHERE cur.score > prev.score) as improved,
+    COUNT(*) FILTER (WHERE cur.score < prev.score) as declined,
+    COUNT(*) FILTER (WHERE cur.score = prev.score) as unchanged,
+    ROUND(AVG(cur.score - prev.score), 2) as avg_change
+FROM measure_scores cur
+JOIN measure_scores prev 
+  ON prev.contract_id = cur.contract_id
+ AND prev.measure_id = cur.measure_id
+ AND prev.year = cur.year - 1
+WHERE cur.year = (SELECT MAX(year) FROM measure_scores)
+  AND cur.score IS NOT NULL
+  AND prev.score IS NOT NULL
+GROUP BY cur.measure_id
+ORDER BY avg_change;
\ No newline at end of file
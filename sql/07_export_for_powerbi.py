@@ -1,105 +1,191 @@
-import pandas as pd
-from sqlalchemy import create_engine, text
 import os
+import time
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-DB_CONFIG = {
-    'user': 'postgres',
-    'password': 'postgres',
-    'host': 'localhost',
-    'port': '5432',
-    'database': 'medicare_star_ratings'
-}
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 
-def get_db_engine():
-    connection_string = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-    return create_engine(connection_string)
+from db import transaction
+from instrumentation import get_logger, instrumented, record_rows, record_statements
 
-def export_data():
-    print("Exporting data for Power BI...")
-    
-    engine = get_db_engine()
-    output_dir = "powerbi_data"
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    
+log = get_logger('export')
+
+OUTPUT_DIR = "powerbi_data"
+
+# Also write a Parquet copy of every export (Power BI imports it faster than CSV)
+WRITE_PARQUET = False
+
+# Export file name -> query. The dashboard shows the latest rating year; the
+# year filter on each query reads a single partition / index range
+EXPORTS = {
     # Export 1: All 3.5-star plans
-    print("\n1. Exporting 3.5-star contracts...")
-    query1 = """
-        SELECT contract_id, contract_name, organization_type, 
-               overall_star_rating, part_c_summary_star, part_d_summary_star 
-        FROM contracts 
-        WHERE overall_star_rating = 3.5
-    """
-    df1 = pd.read_sql(query1, engine)
-    df1.to_csv(f"{output_dir}/contracts_35_stars.csv", index=False)
-    print(f"   Exported {len(df1)} contracts")
-    
+    'contracts_35_stars': """
+        SELECT contract_id, contract_name, organization_type,
+               overall_star_rating, part_c_summary_star, part_d_summary_star
+        FROM contracts
+        WHERE year = (SELECT MAX(year) FROM contracts)
+          AND overall_star_rating = 3.5
+    """,
     # Export 2: Measure scores for 3.5-star plans
-    print("\n2. Exporting measure scores for 3.5-star plans...")
-    query2 = """
-        SELECT ms.contract_id, c.contract_name, ms.measure_id, mm.measure_name, 
-               ms.score, mm.weight, mm.domain
-        FROM measure_scores ms
-        JOIN contracts c ON TRIM(ms.contract_id) = TRIM(c.contract_id)
-        JOIN measure_metadata mm ON ms.measure_id = mm.measure_id
-        WHERE c.overall_star_rating = 3.5 
-          AND ms.score IS NOT NULL
-    """
-    df2 = pd.read_sql(query2, engine)
-    df2.to_csv(f"{output_dir}/measure_scores_35_stars.csv", index=False)
-    print(f"   Exported {len(df2)} measure scores")
-    
+    'measure_scores_35_stars': """
+        SELECT contract_id, contract_name, measure_id, measure_name,
+               score, weight, domain
+        FROM contract_measure_facts
+        WHERE year = (SELECT MAX(year) FROM contract_measure_facts)
+          AND overall_star_rating = 3.5
+          AND score IS NOT NULL
+    """,
     # Export 3: Measure prioritization matrix
-    print("\n3. Exporting measure priorities...")
-    query3 = """
-        SELECT 
-            ms.measure_id, 
-            mm.measure_name, 
-            mm.weight, 
-            mm.domain,
-            AVG(ms.score) as avg_score,
+    'measure_priorities': """
+        SELECT
+            measure_id,
+            measure_name,
+            weight,
+            domain,
+            AVG(score) as avg_score,
             COUNT(*) as num_plans_struggling,
-            ROUND(mm.weight * (4.0 - AVG(ms.score)), 2) as improvement_potential
-        FROM measure_scores ms
-        JOIN measure_metadata mm ON ms.measure_id = mm.measure_id
-        JOIN contracts c ON TRIM(ms.contract_id) = TRIM(c.contract_id)
-        WHERE c.overall_star_rating = 3.5 
-          AND ms.score IS NOT NULL 
-          AND ms.score < 4.0
-        GROUP BY ms.measure_id, mm.measure_name, mm.weight, mm.domain
+            ROUND(weight * (4.0 - AVG(score)), 2) as improvement_potential
+        FROM contract_measure_facts
+        WHERE year = (SELECT MAX(year) FROM contract_measure_facts)
+          AND overall_star_rating = 3.5
+          AND score IS NOT NULL
+          AND score < 4.0
+        GROUP BY measure_id, measure_name, weight, domain
         ORDER BY improvement_potential DESC
-    """
-    df3 = pd.read_sql(query3, engine)
-    df3.to_csv(f"{output_dir}/measure_priorities.csv", index=False)
-    print(f"   Exported {len(df3)} measure priorities")
-    
+    """,
     # Export 4: All contracts summary
-    print("\n4. Exporting all contracts summary...")
-    query4 = """
-        SELECT 
-            contract_id, 
-            contract_name, 
-            organization_type, 
+    'all_contracts': """
+        SELECT
+            contract_id,
+            contract_name,
+            organization_type,
             overall_star_rating,
-            CASE 
+            CASE
                 WHEN overall_star_rating >= 4.0 THEN 'Bonus Eligible'
                 WHEN overall_star_rating = 3.5 THEN 'Near Bonus'
                 ELSE 'Below Threshold'
             END as bonus_status
-        FROM contracts 
-        WHERE overall_star_rating IS NOT NULL
+        FROM contracts
+        WHERE year = (SELECT MAX(year) FROM contracts)
+          AND overall_star_rating IS NOT NULL
+    """,
+    # Export 5: Parent organization rollup (filter visuals on grouping_id)
+    'parent_org_rollup': """
+        SELECT *
+        FROM parent_org_rollup
+        WHERE year = (SELECT MAX(year) FROM parent_org_rollup)
+        ORDER BY grouping_id, parent_organization, organization_type, snp_flag, domain
+    """,
+}
+
+# Postgres type OID -> Arrow type for the Parquet copy (anything else is a string)
+PG_ARROW_TYPES = {
+    20: pa.int64(),      # bigint
+    21: pa.int16(),      # smallint
+    23: pa.int32(),      # integer
+    700: pa.float32(),   # real
+    701: pa.float64(),   # double precision
+    1700: pa.float64(),  # numeric
+}
+
+def copy_query_to_csv(query, csv_path, cur):
+    """Stream a query result to csv_path with COPY TO STDOUT; returns the Arrow column types"""
+    cur.execute(f"SELECT * FROM ({query}) export_query LIMIT 0")
+    record_statements()
+    column_types = {col.name: PG_ARROW_TYPES.get(col.type_code, pa.string()) for col in cur.description}
+
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    record_statements()
+    return column_types
+
+def csv_to_parquet(csv_path, parquet_path, column_types=None):
+    """Convert a CSV export to Parquet batch by batch, without loading the whole file"""
+    convert_options = pa_csv.ConvertOptions(column_types=column_types or {}, strings_can_be_null=True)
+    reader = pa_csv.open_csv(csv_path, convert_options=convert_options)
+    with pq.ParquetWriter(parquet_path, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+
+def export_query(name, query, output_dir=OUTPUT_DIR, write_parquet=WRITE_PARQUET):
+    """Run one export on its own pooled connection and write it to output_dir.
+
+    Postgres streams the result with COPY and DuckDB writes the file itself,
+    so neither holds it in memory. Returns the row count, seconds and bytes.
     """
-    df4 = pd.read_sql(query4, engine)
-    df4.to_csv(f"{output_dir}/all_contracts.csv", index=False)
-    print(f"   Exported {len(df4)} contracts")
-    
-    print(f"\nAll data exported to {output_dir}/ folder!")
-    print("\nFiles created:")
-    print("  - contracts_35_stars.csv")
-    print("  - measure_scores_35_stars.csv")
-    print("  - measure_priorities.csv")
-    print("  - all_contracts.csv")
+    start = time.perf_counter()
+    csv_path = os.path.join(output_dir, f"{name}.csv")
+    column_types = None
+    rows = None
+
+    with transaction() as conn:
+        if conn.dialect.name == 'postgresql':
+            with conn.connection.driver_connection.cursor() as cur:
+                column_types = copy_query_to_csv(query, csv_path, cur)
+                rows = cur.rowcount
+        elif conn.dialect.name == 'duckdb':
+            target = csv_path.replace("'", "''")
+            rows = conn.exec_driver_sql(f"COPY ({query}) TO '{target}' (FORMAT csv, HEADER)").scalar()
+        else:
+            df = pd.read_sql(query, conn)
+            df.to_csv(csv_path, index=False)
+            rows = len(df)
+    record_rows(rows_out=rows)
+
+    files = {csv_path: os.path.getsize(csv_path)}
+    if write_parquet:
+        parquet_path = os.path.join(output_dir, f"{name}.parquet")
+        csv_to_parquet(csv_path, parquet_path, column_types)
+        files[parquet_path] = os.path.getsize(parquet_path)
+
+    return {
+        'name': name,
+        'rows': rows,
+        'seconds': time.perf_counter() - start,
+        'bytes': files,
+    }
+
+@instrumented('export_data')
+def export_data(output_dir=OUTPUT_DIR, write_parquet=WRITE_PARQUET, max_workers=None, names=None):
+    """Write the EXPORTS to output_dir, or only the `names` given"""
+    unknown = set(names or ()) - set(EXPORTS)
+    if unknown:
+        raise ValueError(f"Unknown exports {sorted(unknown)}, expected some of {list(EXPORTS)}")
+    exports = {name: query for name, query in EXPORTS.items() if not names or name in names}
+
+    log.info("Exporting data for Power BI...")
+
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Each export runs concurrently on its own pooled connection, so the total
+    # time is bounded by the slowest query rather than the sum of all of them.
+    # Each task runs in a copy of this context so it reports to the export span
+    start = time.perf_counter()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(exports)) as executor:
+        futures = [
+            executor.submit(copy_context().run, export_query, name, query, output_dir, write_parquet)
+            for name, query in exports.items()
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result['name']] = result
+    elapsed = time.perf_counter() - start
+
+    for name in exports:
+        log.info(f"  {name}: exported {results[name]['rows']} rows in {results[name]['seconds']:.2f}s")
+
+    log.info(f"All data exported to {output_dir}/ folder in {elapsed:.2f}s!")
+    log.info("Files created:")
+    for name in exports:
+        result = results[name]
+        for path, size in result['bytes'].items():
+            log.info(f"  - {os.path.basename(path)} ({size:,} bytes)")
+    return results
 
 if __name__ == "__main__":
-    export_data()
\ No newline at end of file
+    export_data()
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import transaction
+
+# Results of the 06_analysis_queries.sql analyses, served from memory or disk
+# until the ETL changes the data they read
+CACHE_DIR = "data/cache/analysis"
+
+# Results kept in memory; the least recently used one is evicted first
+MAX_CACHED_RESULTS = int(os.getenv('ANALYSIS_CACHE_SIZE', '64'))
+
+# Analysis name -> parameterized query (see 06_analysis_queries.sql)
+ANALYSES = {
+    # Query 1: plans at a given overall rating
+    'plans_at_rating': """
+        SELECT contract_id, contract_name, overall_star_rating
+        FROM contracts
+        WHERE year = :year
+          AND overall_star_rating = :rating
+        ORDER BY contract_name
+    """,
+    # Query 2: worst performing measures of those plans
+    'worst_measures': """
+        SELECT contract_id, contract_name, measure_id, measure_name, score, weight
+        FROM contract_measure_facts
+        WHERE year = :year
+          AND overall_star_rating = :rating
+          AND score IS NOT NULL
+          AND score < :target
+        ORDER BY contract_id, weight DESC, score ASC
+        LIMIT :limit
+    """,
+    # Query 3: prioritization matrix
+    'measure_priorities': """
+        SELECT
+            measure_id,
+            measure_name,
+            weight,
+            ROUND(AVG(score), 2) as avg_score,
+            COUNT(*) as num_plans_struggling,
+            ROUND(weight * (:target - AVG(score)), 2) as improvement_potential
+        FROM contract_measure_facts
+        WHERE year = :year
+          AND overall_star_rating = :rating
+          AND score IS NOT NULL
+          AND score < :target
+        GROUP BY measure_id, measure_name, weight
+        ORDER BY improvement_potential DESC
+        LIMIT :limit
+    """,
+    # Query 4: measures one plan should improve first
+    'plan_recommendations': """
+        SELECT
+            contract_name,
+            measure_id,
+            measure_name,
+            score as current_score,
+            weight,
+            ROUND(weight * (:target - score), 2) as impact_if_improved,
+            CASE
+                WHEN score <= 2.0 THEN 'CRITICAL'
+                WHEN score < 4.0 THEN 'HIGH'
+                ELSE 'MEDIUM'
+            END as priority
+        FROM contract_measure_facts
+        WHERE contract_id = :contract_id
+          AND year = :year
+          AND score IS NOT NULL
+          AND score < :target
+        ORDER BY impact_if_improved DESC
+        LIMIT :limit
+    """,
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+def data_version(conn):
+    """Stamp of the data the analyses read.
+
+    Every transform stage records its input hash and commit time in
+    etl_manifest, so the stamp changes exactly when a stage commits new
+    data. 05_update_weights.sql changes weights without a manifest entry,
+    so the weights are part of the stamp too.
+    """
+    digest = hashlib.sha256()
+    for row in conn.execute(text("SELECT stage, year, source_hash, updated_at FROM etl_manifest ORDER BY stage, year")):
+        digest.update(repr(tuple(row)).encode())
+    for row in conn.execute(text("SELECT measure_id, weight FROM measure_metadata ORDER BY measure_id")):
+        digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()[:16]
+
+def latest_year(conn):
+    return conn.execute(text("SELECT MAX(year) FROM contract_measure_facts")).scalar()
+
+def cache_key(name, params, version):
+    """Cache key of one analysis run: its name, parameters and the data version"""
+    payload = json.dumps({'analysis': name, 'params': params}, sort_keys=True, default=str)
+    return f"{version}-{name}-{hashlib.sha256(payload.encode()).hexdigest()[:16]}"
+
+def _remember(key, result):
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED_RESULTS:
+            _cache.popitem(last=False)
+            _stats['evictions'] += 1
+
+def _read_disk(key, cache_dir):
+    path = Path(cache_dir) / f"{key}.parquet"
+    return pd.read_parquet(path) if path.exists() else None
+
+def _write_disk(key, version, result, cache_dir):
+    """Store a result as Parquet, removing results of older data versions"""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for stale in cache_dir.glob("*.parquet"):
+        if not stale.name.startswith(f"{version}-"):
+            stale.unlink(missing_ok=True)
+    # Write to a temp file first so a concurrent reader never sees a partial file
+    path = cache_dir / f"{key}.parquet"
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    result.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def run_analysis(name, cache_dir=CACHE_DIR, use_cache=True, **params):
+    """Run one of ANALYSES with params, serving repeated runs from the cache.
+
+    year defaults to the latest rating year. Results are looked up in memory,
+    then on disk, and only queried when neither holds them for the current
+    data version. Returned frames are shared with the cache: copy before
+    modifying them.
+    """
+    with transaction() as conn:
+        if params.get('year') is None:
+            params['year'] = latest_year(conn)
+        version = data_version(conn)
+        key = cache_key(name, params, version)
+
+        if use_cache:
+            with _cache_lock:
+                result = _cache.get(key)
+                if result is not None:
+                    _cache.move_to_end(key)
+                    _stats['memory_hits'] += 1
+                    return result
+            result = _read_disk(key, cache_dir)
+            if result is not None:
+                with _cache_lock:
+                    _stats['disk_hits'] += 1
+                _remember(key, result)
+                return result
+
+        with _cache_lock:
+            _stats['misses'] += 1
+        result = pd.read_sql(text(ANALYSES[name]), conn, params=params)
+
+    if use_cache:
+        _remember(key, result)
+        _write_disk(key, version, result, cache_dir)
+    return result
+
+def plans_at_rating(rating=3.5, year=None):
+    return run_analysis('plans_at_rating', rating=rating, year=year)
+
+def worst_measures(rating=3.5, year=None, target=4.0, limit=50):
+    return run_analysis('worst_measures', rating=rating, year=year, target=target, limit=limit)
+
+def measure_priorities(rating=3.5, year=None, target=4.0, limit=20):
+    return run_analysis('measure_priorities', rating=rating, year=year, target=target, limit=limit)
+
+def plan_recommendations(contract_id, year=None, target=4.0, limit=10):
+    return run_analysis('plan_recommendations', contract_id=contract_id, year=year, target=target, limit=limit)
+
+def cache_stats():
+    """Memory hits, disk hits, misses and evictions so far, plus the cached result count"""
+    with _cache_lock:
+        return dict(_stats, cached_results=len(_cache))
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """Drop every cached result from memory and disk"""
+    with _cache_lock:
+        _cache.clear()
+    for path in Path(cache_dir).glob("*.parquet"):
+        path.unlink(missing_ok=True)
+
+if __name__ == "__main__":
+    print(f"Prioritization matrix for 3.5-star plans:\n{measure_priorities().to_string(index=False)}")
+    print(f"\nRecommendations for H0107:\n{plan_recommendations('H0107').to_string(index=False)}")
+    measure_priorities()
+    print(f"\nCache: {cache_stats()}")
@@ -0,0 +1,122 @@
+import argparse
+import importlib
+import json
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from generate_synthetic_data import SYNTHETIC_DIR, generate
+from raw_cache import clear_cache
+
+load_data = importlib.import_module('02_load_data')
+transform = importlib.import_module('03_transform')
+export = importlib.import_module('07_export_for_powerbi')
+
+BENCHMARK_DIR = "benchmarks"
+
+def benchmark_stages(raw_dir, output_dir):
+    """(stage name, callable) pairs in pipeline order; every stage does its full work"""
+    return [
+        ('load_all_releases', lambda: load_data.load_all_releases(raw_dir, incremental=False)),
+        ('transform_contracts', lambda: transform.transform_contracts(force=True)),
+        ('transform_measure_metadata', lambda: transform.transform_measure_metadata(force=True)),
+        ('transform_measure_scores', lambda: transform.transform_measure_scores(force=True)),
+        ('transform_measure_values', lambda: transform.transform_measure_values(force=True)),
+        ('transform_cut_points', lambda: transform.transform_cut_points(force=True)),
+        ('build_contract_measure_facts', lambda: transform.build_contract_measure_facts(force=True)),
+        ('build_parent_org_rollup', lambda: transform.build_parent_org_rollup(force=True)),
+        ('export_data', lambda: export.export_data(output_dir=output_dir)),
+    ]
+
+def profile(func):
+    """Run func twice: once timed, once under tracemalloc for its peak Python allocation.
+
+    Tracing every allocation slows Python code down several times, so the
+    wall and CPU times come from the untraced run. The traced run comes second
+    and reuses the caches the first one filled (e.g. parsed CSVs), so on a
+    cold run the peak is that of the cached path. tracemalloc only sees this process, so
+    work done by Postgres or the parser worker processes shows up in the wall
+    time but not the memory.
+    """
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    func()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    tracemalloc.start()
+    try:
+        func()
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        'seconds': round(wall, 4),
+        'cpu_seconds': round(cpu, 4),
+        'peak_python_mb': round(peak / 2**20, 2),
+    }
+
+def code_version():
+    """Git commit of the working tree, so results can be compared between versions"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(scale, years=None, cold=False, results_dir=BENCHMARK_DIR):
+    """Benchmark every load, transform and export stage against synthetic data at `scale`.
+
+    The synthetic releases are generated once per scale. The stages rebuild the
+    tables of the configured database, so point DB_NAME at a scratch database.
+    cold=True clears the parsed-CSV cache first so parsing is measured too.
+    Results are written to results_dir as JSON and returned.
+    """
+    raw_dir = Path(f"{SYNTHETIC_DIR}/x{scale}")
+    if not raw_dir.exists():
+        print(f"Generating synthetic data at {scale}x...")
+        generate(scale, years, out_dir=raw_dir)
+    if cold:
+        clear_cache()
+
+    results = {
+        'version': code_version(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'scale': scale,
+        'raw_dir': str(raw_dir),
+        'raw_bytes': sum(path.stat().st_size for path in raw_dir.glob('*/*.csv')),
+        'cold_cache': cold,
+        'stages': {},
+    }
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name, func in benchmark_stages(str(raw_dir), output_dir):
+            print(f"\n=== {name} ===")
+            results['stages'][name] = profile(func)
+    results['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    print(f"\nBenchmark at {scale}x:")
+    for name, stage in results['stages'].items():
+        print(f"  {name}: {stage['seconds']:.2f}s wall, {stage['cpu_seconds']:.2f}s CPU, "
+              f"{stage['peak_python_mb']:.1f} MB peak")
+
+    Path(results_dir).mkdir(parents=True, exist_ok=True)
+    stamp = results['timestamp'].replace(':', '').replace('-', '')
+    out_path = Path(results_dir) / f"x{scale}-{results['version'] or 'unknown'}-{stamp}.json"
+    out_path.write_text(json.dumps(results, indent=2))
+    print(f"Results saved to {out_path}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ETL stages on synthetic CMS data")
+    parser.add_argument('--scale', type=int, nargs='+', default=[10], help="e.g. --scale 10 100 1000")
+    parser.add_argument('--years', type=int, nargs='*', help="release years to generate")
+    parser.add_argument('--cold', action='store_true', help="clear the parsed-CSV cache first")
+    args = parser.parse_args()
+
+    for scale in args.scale:
+        run_benchmark(scale, args.years, args.cold)
@@ -0,0 +1,133 @@
+import argparse
+import importlib
+import inspect
+import sys
+from pathlib import Path
+
+# Only the standard library is imported up front: each command imports the
+# stage modules it runs (and with them pandas, SQLAlchemy, ...) when it runs,
+# so `--help` and single-step runs do not pay for the whole pipeline.
+
+# Selectable step -> (module, function), in the order the pipeline runs them
+LOADS = {
+    'summary_ratings': ('02_load_data', 'load_summary_ratings'),
+    'measure_stars': ('02_load_data', 'load_measure_stars'),
+    'measure_data': ('02_load_data', 'load_measure_data'),
+    'cut_points': ('02_load_data', 'load_cut_points'),
+    'workbooks': ('workbooks', 'load_workbooks'),
+}
+
+TRANSFORMS = {
+    'contracts': ('03_transform', 'transform_contracts'),
+    'measure_metadata': ('03_transform', 'transform_measure_metadata'),
+    'measure_scores': ('03_transform', 'transform_measure_scores'),
+    'measure_values': ('03_transform', 'transform_measure_values'),
+    'cut_points': ('03_transform', 'transform_cut_points'),
+    'facts': ('03_transform', 'build_contract_measure_facts'),
+    'rollup': ('03_transform', 'build_parent_org_rollup'),
+}
+
+# Stage function parameter -> the command line flag setting it
+OPTION_FLAGS = {'years': '--year', 'force': '--force'}
+
+class SelectorError(Exception):
+    """A step named on the command line does not support a selector that was passed"""
+
+def resolve(module, function):
+    return getattr(importlib.import_module(module), function)
+
+def unsupported_options(func, options):
+    """Options passed on the command line (not None) that func does not accept"""
+    accepted = inspect.signature(func).parameters
+    return [name for name, value in options.items() if value is not None and name not in accepted]
+
+def run_step(func, **options):
+    """Call a stage function with the options it accepts (years, force, ...); None means its default"""
+    accepted = inspect.signature(func).parameters
+    return func(**{name: value for name, value in options.items() if value is not None and name in accepted})
+
+def run_steps(steps, selected, **options):
+    """Run the selected steps (default: all) with options.
+
+    A step named explicitly must accept every option passed, checked before
+    anything runs. When running all steps, those without a selector (e.g.
+    measure_metadata, which spans every year) run in full.
+    """
+    funcs = {name: resolve(*steps[name]) for name in selected or steps}
+    for name in selected or ():
+        unsupported = unsupported_options(funcs[name], options)
+        if unsupported:
+            flags = ', '.join(OPTION_FLAGS[option] for option in unsupported)
+            raise SelectorError(f"{name} does not support {flags}")
+    for name, func in funcs.items():
+        run_step(func, **options)
+
+def run_pipeline_command(args):
+    resolve('run_pipeline', 'run_pipeline')(max_workers=args.workers, resume=args.resume)
+
+def schema_command(args):
+    resolve('run_pipeline', 'create_schema')()
+
+def load_command(args):
+    run_steps(LOADS, args.tables, years=args.years)
+
+def transform_command(args):
+    run_steps(TRANSFORMS, args.tables, years=args.years, force=args.force or None)
+
+def export_command(args):
+    resolve('07_export_for_powerbi', 'export_data')(
+        output_dir=args.output_dir, write_parquet=args.parquet, names=args.names or None)
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='star-ratings',
+        description="Medicare Star Ratings ETL. Run from the repository root (data/ paths are relative)."
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    pipeline = commands.add_parser('pipeline', help="run every stage as a dependency graph")
+    pipeline.add_argument('--resume', action='store_true', help="skip stages completed by the last failed run")
+    pipeline.add_argument('--workers', type=int, default=4, help="stages run concurrently")
+    pipeline.set_defaults(run=run_pipeline_command)
+
+    schema = commands.add_parser('schema', help="create the tables of the configured backend")
+    schema.set_defaults(run=schema_command)
+
+    years = argparse.ArgumentParser(add_help=False)
+    years.add_argument('--year', dest='years', type=int, action='append',
+                       help="rating year to process (repeatable); default: every staged year")
+
+    load = commands.add_parser('load', parents=[years], help="load raw releases into staging")
+    load.add_argument('tables', nargs='*', choices=list(LOADS), metavar='TABLE',
+                      help=f"tables to load (default: all): {', '.join(LOADS)}")
+    load.set_defaults(run=load_command, parser=load)
+
+    transform = commands.add_parser('transform', parents=[years], help="transform staging into production tables")
+    transform.add_argument('tables', nargs='*', choices=list(TRANSFORMS), metavar='TABLE',
+                           help=f"tables to build (default: all): {', '.join(TRANSFORMS)}")
+    transform.add_argument('--force', action='store_true', help="rebuild years whose inputs did not change")
+    transform.set_defaults(run=transform_command, parser=transform)
+
+    export = commands.add_parser('export', help="write the Power BI exports")
+    export.add_argument('names', nargs='*', metavar='NAME',
+                        help="exports to write, e.g. contracts_35_stars (default: all)")
+    export.add_argument('--output-dir', default='powerbi_data', help="directory for the CSV files")
+    export.add_argument('--parquet', action='store_true', help="also write a Parquet copy of each export")
+    export.set_defaults(run=export_command)
+    return parser
+
+def main(argv=None):
+    # The stages import each other and read their .sql files from this
+    # directory, so only a source checkout (or editable install) can run them
+    if not (Path(__file__).resolve().parent / '01_schema.sql').exists():
+        sys.exit("star-ratings runs from the repository's sql/ directory: "
+                 "install the project editable (uv sync or pip install -e .)")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.run(args)
+    except SelectorError as error:
+        args.parser.error(str(error))
+
+if __name__ == "__main__":
+    main()
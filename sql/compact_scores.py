@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from db import transaction
+
+# Measure stars are half-star steps from 1 to 5, stored as int8 half-star units
+# (3.5 stars -> 7) with MISSING_STARS where CMS published no star
+STAR_UNITS = 2
+MISSING_STARS = -1
+
+# Rows converted per read; only one chunk is ever held as Python objects
+CHUNK_ROWS = 100_000
+
+def encode_stars(scores):
+    """Star ratings (float, NaN for missing) -> int8 half-star units"""
+    scores = np.asarray(scores, dtype=float)
+    return np.where(np.isnan(scores), MISSING_STARS, np.rint(scores * STAR_UNITS)).astype(np.int8)
+
+def decode_stars(units):
+    """int8 half-star units -> float star ratings with NaN for missing"""
+    units = np.asarray(units)
+    return np.where(units == MISSING_STARS, np.nan, units / STAR_UNITS)
+
+def load_dictionaries(conn):
+    """Shared contract and measure ID dictionaries as pandas CategoricalDtypes.
+
+    Every frame loaded with the same dictionaries uses the same integer code
+    for an ID, so frames of different years can be concatenated, joined and
+    grouped on the codes without going back to strings.
+    """
+    contract_ids = [row[0] for row in conn.execute(text("SELECT DISTINCT contract_id FROM contracts ORDER BY contract_id"))]
+    measure_ids = [row[0] for row in conn.execute(text("SELECT measure_id FROM measure_metadata ORDER BY measure_id"))]
+    return pd.CategoricalDtype(contract_ids), pd.CategoricalDtype(measure_ids)
+
+def encode_ids(ids, dtype, column):
+    """IDs -> categorical over a shared dictionary; raises ValueError for IDs missing from it"""
+    codes = pd.Categorical(ids, dtype=dtype)
+    unknown = pd.unique(ids[(codes.codes < 0) & ids.notna().to_numpy()])
+    if len(unknown):
+        raise ValueError(f"{column}: {len(unknown)} IDs missing from the dictionary, e.g. {list(unknown[:5])}")
+    return codes
+
+def load_scores(conn, years=None, dictionaries=None, chunk_rows=CHUNK_ROWS):
+    """Load measure_scores as a compact frame.
+
+    Columns: year (int16), contract_id and measure_id (categoricals over the
+    shared dictionaries, stored as int16/int8 codes) and stars (int8 half-star
+    units). years limits the read to those years' partitions. Raises
+    ValueError when an ID is missing from the dictionaries (e.g. ones loaded
+    before the scores changed), instead of silently coding it as NaN.
+    """
+    contract_dtype, measure_dtype = dictionaries or load_dictionaries(conn)
+    query = "SELECT year, contract_id, measure_id, CAST(score AS DOUBLE PRECISION) AS score FROM measure_scores"
+    params = {}
+    if years:
+        query += " WHERE year IN :years"
+        params['years'] = [int(year) for year in years]
+    # stream_results reads through a server-side cursor on Postgres; otherwise
+    # psycopg2 buffers the whole result before the first chunk is returned
+    query = (text(query).bindparams(*([bindparam('years', expanding=True)] if years else []))
+             .execution_options(stream_results=True))
+
+    chunks = []
+    for chunk in pd.read_sql(query, conn, params=params, chunksize=chunk_rows):
+        chunks.append(pd.DataFrame({
+            'year': chunk['year'].to_numpy(np.int16),
+            'contract_id': encode_ids(chunk['contract_id'], contract_dtype, 'contract_id'),
+            'measure_id': encode_ids(chunk['measure_id'], measure_dtype, 'measure_id'),
+            'stars': encode_stars(chunk['score']),
+        }))
+    if not chunks:
+        return pd.DataFrame({
+            'year': np.array([], dtype=np.int16),
+            'contract_id': pd.Categorical([], dtype=contract_dtype),
+            'measure_id': pd.Categorical([], dtype=measure_dtype),
+            'stars': np.array([], dtype=np.int8),
+        })
+    return pd.concat(chunks, ignore_index=True)
+
+def score_matrix(scores, year):
+    """One year of a compact frame as a dense (contract code x measure code) int8 matrix.
+
+    Rows and columns follow the dictionary order (scores['contract_id'].cat.categories
+    and scores['measure_id'].cat.categories); unscored cells hold MISSING_STARS.
+    Raises ValueError for rows without a code (-1), which would otherwise be
+    written into the last row or column.
+    """
+    year_scores = scores[scores['year'] == year]
+    contract_codes = year_scores['contract_id'].cat.codes.to_numpy()
+    measure_codes = year_scores['measure_id'].cat.codes.to_numpy()
+    uncoded = (contract_codes < 0) | (measure_codes < 0)
+    if uncoded.any():
+        raise ValueError(f"{uncoded.sum()} rows of {year} have a contract or measure ID missing from the dictionaries")
+    matrix = np.full((len(scores['contract_id'].cat.categories), len(scores['measure_id'].cat.categories)),
+                     MISSING_STARS, dtype=np.int8)
+    matrix[contract_codes, measure_codes] = year_scores['stars']
+    return matrix
+
+def memory_mb(frame):
+    return frame.memory_usage(index=False, deep=True).sum() / 2**20
+
+if __name__ == "__main__":
+    with transaction() as conn:
+        plain = pd.read_sql("SELECT year, contract_id, measure_id, score FROM measure_scores", conn)
+        scores = load_scores(conn)
+
+    print(f"measure_scores: {len(scores)} rows")
+    print(f"  pd.read_sql: {memory_mb(plain):.2f} MB")
+    print(f"  compact:     {memory_mb(scores):.2f} MB")
+
+    # Groupbys run on the integer codes
+    scored = scores[scores['stars'] != MISSING_STARS]
+    average = scored.groupby(['year', 'measure_id'], observed=True)['stars'].mean() / STAR_UNITS
+    print(f"\nAverage stars by year and measure:\n{average.unstack('year').round(2).head(10).to_string()}")
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+# Settings come from the environment or a .env file in the working directory
+load_dotenv()
+
+# 'postgres' (default) or 'duckdb' for an embedded, in-process database file
+DB_BACKEND = os.getenv('DB_BACKEND', 'postgres')
+DUCKDB_PATH = os.getenv('DUCKDB_PATH', 'data/medicare_star_ratings.duckdb')
+
+# Database connection
+DB_CONFIG = {
+    'user': os.getenv('DB_USER', 'postgres'),
+    'password': os.getenv('DB_PASSWORD', 'postgres'),
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5432'),
+    'database': os.getenv('DB_NAME', 'medicare_star_ratings')
+}
+
+# Connection pool shared by every stage in the process
+POOL_CONFIG = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+    'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'connects': 0,
+    'checkouts': 0,
+    'checkins': 0,
+    'checkout_wait_seconds': 0.0,
+    'max_checkout_wait_seconds': 0.0,
+    'hold_seconds': 0.0,
+}
+
+def _bump(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+def _register_pool_events(engine):
+    """Count physical connects, checkouts and how long connections are held"""
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_conn, record):
+        _bump(connects=1)
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_conn, record, proxy):
+        record.info['checked_out_at'] = time.perf_counter()
+        _bump(checkouts=1)
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_conn, record):
+        checked_out_at = record.info.pop('checked_out_at', None)
+        held = time.perf_counter() - checked_out_at if checked_out_at else 0.0
+        _bump(checkins=1, hold_seconds=held)
+
+def connection_url():
+    """SQLAlchemy URL of the configured backend"""
+    if DB_BACKEND == 'duckdb':
+        os.makedirs(os.path.dirname(DUCKDB_PATH) or '.', exist_ok=True)
+        return f"duckdb:///{DUCKDB_PATH}"
+    return f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+
+def get_db_engine():
+    """Return the process-wide SQLAlchemy engine, creating it on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            connection_string = connection_url()
+            _engine = create_engine(connection_string, poolclass=QueuePool, pool_pre_ping=True, **POOL_CONFIG)
+            _register_pool_events(_engine)
+    return _engine
+
+@contextmanager
+def transaction():
+    """Check out one pooled connection and run the block in a single transaction.
+
+    Commits on success and rolls back on error; the time spent waiting for a
+    free connection is recorded in pool_stats().
+    """
+    start = time.perf_counter()
+    with get_db_engine().begin() as conn:
+        waited = time.perf_counter() - start
+        with _stats_lock:
+            _stats['checkout_wait_seconds'] += waited
+            _stats['max_checkout_wait_seconds'] = max(_stats['max_checkout_wait_seconds'], waited)
+        yield conn
+
+def backend():
+    """Dialect name of the engine: 'postgresql' or 'duckdb'"""
+    return get_db_engine().dialect.name
+
+def affected_rows(result):
+    """Rows written by an INSERT/UPDATE/DELETE result.
+
+    DuckDB leaves rowcount at -1 and returns the count as a one-row result.
+    """
+    if result.rowcount >= 0:
+        return result.rowcount
+    return result.scalar() or 0
+
+def pool_stats():
+    """Snapshot of pool usage: churn (physical connects vs checkouts), wait and hold times"""
+    with _stats_lock:
+        stats = dict(_stats)
+    checkouts = stats['checkouts'] or 1
+    stats['avg_checkout_wait_ms'] = stats['checkout_wait_seconds'] / checkouts * 1000
+    stats['avg_hold_ms'] = stats['hold_seconds'] / max(stats['checkins'], 1) * 1000
+    if _engine is not None:
+        pool = _engine.pool
+        stats.update({
+            'pool_size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+        })
+    return stats
+
+def dispose_engine():
+    """Close every idle pooled connection, e.g. before forking worker processes.
+
+    The engine stays in use with a fresh pool, so connections other threads
+    have checked out are unaffected; they are closed when returned.
+    """
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
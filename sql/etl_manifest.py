@@ -0,0 +1,45 @@
+from sqlalchemy import text
+
+# ETL run manifest: one row per (stage, year) with the hash of the input that
+# stage last processed. Load stages hash the raw CSV, transform stages record
+# the hash of the load stage(s) they consumed, so unchanged years are skipped.
+
+def get_stage_hashes(conn, stage):
+    """Return {year: source_hash} recorded for a stage"""
+    result = conn.execute(
+        text("SELECT year, source_hash FROM etl_manifest WHERE stage = :stage"),
+        {'stage': stage}
+    )
+    return {row[0]: row[1] for row in result}
+
+def combined_hash(conn, source_stages, year):
+    """Hash of the inputs a transform stage reads for one year (None if never loaded)"""
+    hashes = [get_stage_hashes(conn, source).get(year) for source in source_stages]
+    if any(h is None for h in hashes):
+        return None
+    return ','.join(hashes)
+
+def pending_years(conn, stage, source_stages, staged_years, force=False):
+    """Return {year: source_hash} for staged years whose inputs changed since `stage` last ran.
+
+    Years without a recorded input hash (loaded outside the manifest) are
+    always processed.
+    """
+    processed = get_stage_hashes(conn, stage)
+    pending = {}
+    for year in sorted(staged_years):
+        source_hash = combined_hash(conn, source_stages, year)
+        if force or source_hash is None or processed.get(year) != source_hash:
+            pending[year] = source_hash
+    return pending
+
+def record_stage(conn, stage, year, source_hash, row_count):
+    """Record that `stage` processed `year` from inputs with `source_hash`"""
+    conn.execute(text("""
+        INSERT INTO etl_manifest (stage, year, source_hash, row_count, updated_at)
+        VALUES (:stage, :year, :source_hash, :row_count, now())
+        ON CONFLICT (stage, year) DO UPDATE SET
+            source_hash = EXCLUDED.source_hash,
+            row_count = EXCLUDED.row_count,
+            updated_at = EXCLUDED.updated_at
+    """), {'stage': stage, 'year': int(year), 'source_hash': source_hash, 'row_count': int(row_count)})
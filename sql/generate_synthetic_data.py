@@ -0,0 +1,102 @@
+import csv
+import importlib
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+load_data = importlib.import_module('02_load_data')
+
+SYNTHETIC_DIR = "data/synthetic"
+
+# Release table -> (header rows, leading contract-info columns). Everything after
+# the contract-info columns is resampled per column from the template release,
+# so text cells such as "Not enough data available" keep their real frequency.
+ROW_TABLES = {
+    'summary_ratings': (2, 6),
+    'measure_stars': (4, 5),
+    'measure_data': (4, 5),
+}
+
+def read_raw_rows(file_path):
+    """Read a CMS CSV as a grid of raw latin-1 strings, padded to the widest row"""
+    return pd.read_csv(file_path, header=None, dtype=str, keep_default_na=False,
+                       encoding='latin-1').to_numpy()
+
+def replace_year(rows, template_year, year):
+    """Rewrite the release year in header cells ("2024 Part C Summary" -> "2030 Part C Summary")"""
+    if template_year == year:
+        return rows
+    return np.vectorize(lambda cell: cell.replace(str(template_year), str(year)), otypes=[object])(rows)
+
+def synthetic_file_name(template_path, year, scale):
+    """Keep the CMS file name layout so discover_releases() picks the file up"""
+    match = load_data.RELEASE_FILE_PATTERN.match(Path(template_path).name)
+    return f"{year} Star Ratings Data Table - {match.group('table')} (Synthetic x{scale}).csv"
+
+def write_scaled_table(template_path, out_path, table, template_year, year, scale, seed):
+    """Write `scale` synthetic copies of every contract row of one template file.
+
+    Replicate r of contract "H0022 " becomes "H0022-r " (the trailing space CMS
+    pads IDs with is kept). Measure and rating cells are drawn from the same
+    template column, with the same draws for every table of a release, so a
+    synthetic contract's Measure Stars and Measure Data cells line up.
+    """
+    header_rows, info_columns = ROW_TABLES[table]
+    rows = read_raw_rows(template_path)
+    header, data = rows[:header_rows], rows[header_rows:]
+    n_rows = len(data)
+
+    rng = np.random.default_rng([seed, year])
+    with open(out_path, 'w', newline='', encoding='latin-1') as f:
+        writer = csv.writer(f)
+        writer.writerows(replace_year(header, template_year, year))
+        for replicate in range(scale):
+            # One block per replicate keeps memory at the size of the template
+            block = data.copy()
+            draws = rng.integers(0, n_rows, size=(n_rows, data.shape[1] - info_columns))
+            block[:, info_columns:] = np.take_along_axis(data[:, info_columns:], draws, axis=0)
+            block[:, 0] = [f"{cell.strip()}-{replicate} " for cell in data[:, 0]]
+            writer.writerows(block)
+    return n_rows * scale
+
+def generate(scale, years=None, raw_dir=load_data.RAW_DIR, out_dir=None, seed=0):
+    """Generate CMS-shaped releases with `scale` times the contracts of the real ones.
+
+    years defaults to the real release years; any other year is generated from
+    the latest real release up to that year (or the earliest, for older years).
+    Cut-point files are copied with only the year rewritten. Returns the
+    directory to pass as raw_dir to the loaders.
+    """
+    templates = load_data.discover_releases(raw_dir)
+    if not templates:
+        raise FileNotFoundError(f"No Star Ratings releases found under {raw_dir}")
+    years = sorted(years or templates)
+    out_dir = Path(out_dir or f"{SYNTHETIC_DIR}/x{scale}")
+
+    for year in years:
+        earlier = [template_year for template_year in templates if template_year <= year]
+        template_year = max(earlier) if earlier else min(templates)
+        release_dir = out_dir / f"{year} synthetic"
+        release_dir.mkdir(parents=True, exist_ok=True)
+
+        for table, template_path in templates[template_year].items():
+            out_path = release_dir / synthetic_file_name(template_path, year, scale)
+            if table in ROW_TABLES:
+                rows = write_scaled_table(template_path, out_path, table, template_year, year, scale, seed)
+            else:
+                cut_points = replace_year(read_raw_rows(template_path), template_year, year)
+                with open(out_path, 'w', newline='', encoding='latin-1') as f:
+                    csv.writer(f).writerows(cut_points)
+                rows = len(cut_points)
+            print(f"  {out_path.name}: {rows} rows")
+
+    print(f"Synthetic releases written to {out_dir}/")
+    return str(out_dir)
+
+if __name__ == "__main__":
+    # python sql/generate_synthetic_data.py 100 [year ...]
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    years = [int(year) for year in sys.argv[2:]] or None
+    generate(scale, years)
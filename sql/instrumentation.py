@@ -0,0 +1,159 @@
+import functools
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from db import get_db_engine
+
+# 'text' keeps the familiar console output, 'json' emits one JSON object per line
+LOG_FORMAT = os.getenv('ETL_LOG_FORMAT', 'text')
+
+# When set, every finished stage span is appended to this file as a JSON line
+METRICS_FILE = os.getenv('ETL_METRICS_FILE')
+
+_current_span = ContextVar('current_span', default=None)
+_metrics_lock = threading.Lock()
+_listening = False
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; stage spans add their metrics under 'span'"""
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if hasattr(record, 'span'):
+            entry['span'] = record.span
+        return json.dumps(entry, default=str)
+
+def get_logger(name):
+    """Logger under the 'etl' namespace, writing to stdout in LOG_FORMAT"""
+    root = logging.getLogger('etl')
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter('%(message)s'))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        root.propagate = False
+    return root.getChild(name)
+
+log = get_logger('stage')
+
+class Span:
+    """Metrics of one stage run; statements and rows also count toward parent spans"""
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.rows_in = 0
+        self.rows_out = 0
+        self.statements = 0
+
+    def _chain(self):
+        span = self
+        while span is not None:
+            yield span
+            span = span.parent
+
+    def add_rows(self, rows_in=0, rows_out=0):
+        for span in self._chain():
+            span.rows_in += rows_in
+            span.rows_out += rows_out
+
+    def add_statements(self, count=1):
+        for span in self._chain():
+            span.statements += count
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    span = _current_span.get()
+    if span is not None:
+        span.add_statements()
+
+def _listen_for_statements():
+    """Count every statement the shared engine executes toward the active span"""
+    global _listening
+    if not _listening:
+        event.listen(get_db_engine(), 'after_cursor_execute', _count_statement)
+        _listening = True
+
+def record_rows(rows_in=0, rows_out=0):
+    """Add row counts taken from statement results to the active span (if any)"""
+    span = _current_span.get()
+    if span is not None:
+        span.add_rows(int(rows_in), int(rows_out))
+
+def record_statements(count=1):
+    """Count statements issued outside SQLAlchemy (e.g. raw COPY cursors)"""
+    span = _current_span.get()
+    if span is not None:
+        span.add_statements(count)
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+@contextmanager
+def stage_span(name):
+    """Time a pipeline stage and emit its metrics when it finishes.
+
+    Records wall and CPU time, the process's peak RSS, rows in/out reported
+    through record_rows() and the number of statements executed. Threads
+    started inside the span only report to it if they run in a copy of the
+    caller's context (contextvars.copy_context()).
+    """
+    _listen_for_statements()
+    span = Span(name, _current_span.get())
+    token = _current_span.set(span)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    status = 'ok'
+    try:
+        yield span
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        _current_span.reset(token)
+        metrics = {
+            'stage': name,
+            'parent': span.parent.name if span.parent else None,
+            'status': status,
+            'wall_seconds': round(time.perf_counter() - wall_start, 4),
+            'cpu_seconds': round(time.process_time() - cpu_start, 4),
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+            'rows_in': span.rows_in,
+            'rows_out': span.rows_out,
+            'statements': span.statements,
+        }
+        _emit(metrics)
+
+def _emit(metrics):
+    log.info(
+        f"[{metrics['stage']}] {metrics['status']} in {metrics['wall_seconds']:.2f}s "
+        f"(cpu {metrics['cpu_seconds']:.2f}s, rows in {metrics['rows_in']}, out {metrics['rows_out']}, "
+        f"{metrics['statements']} statements, peak RSS {metrics['peak_rss_mb']} MB)",
+        extra={'span': metrics},
+    )
+    if METRICS_FILE:
+        with _metrics_lock, open(METRICS_FILE, 'a') as f:
+            f.write(json.dumps(metrics) + '\n')
+
+def instrumented(name):
+    """Decorator form of stage_span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,65 @@
+from sqlalchemy import bindparam, text
+
+# Production tables partitioned by rating year (LIST partitions on Postgres,
+# one per year, created as years are loaded). Queries filtering on year only
+# touch that year's partition, so adding years does not slow them down.
+PARTITIONED_TABLES = ['contracts', 'measure_scores', 'measure_values', 'cut_points']
+
+# Stages that write the partitioned tables (or read them into the facts); their
+# manifest entries are cleared when legacy tables are dropped so they rebuild
+PARTITIONED_STAGES = [
+    'transform_contracts', 'transform_measure_scores', 'transform_measure_values',
+    'transform_cut_points', 'build_contract_measure_facts',
+]
+
+def partition_name(table, year):
+    return f"{table}_{int(year)}"
+
+def ensure_year_partition(conn, table, year):
+    """Create the partition of `table` holding `year` if it does not exist yet.
+
+    DuckDB has no declarative partitioning (its zone maps skip row groups of
+    other years instead), so this is a no-op there.
+    """
+    if conn.dialect.name != 'postgresql' or table not in PARTITIONED_TABLES:
+        return
+    partition = partition_name(table, year)
+    # Checked first: CREATE TABLE ... PARTITION OF locks the parent table even
+    # when the partition already exists
+    if conn.execute(text("SELECT to_regclass(:partition)"), {'partition': partition}).scalar() is None:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} FOR VALUES IN ({int(year)})"))
+
+def primary_key_columns(conn, table):
+    result = conn.execute(text("""
+        SELECT kcu.column_name
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+          ON kcu.constraint_name = tc.constraint_name
+         AND kcu.table_name = tc.table_name
+        WHERE tc.table_name = :table
+        AND tc.constraint_type = 'PRIMARY KEY'
+    """), {'table': table})
+    return {row[0] for row in result}
+
+def drop_legacy_tables(conn):
+    """Drop year-less production tables created before partitioning by year.
+
+    Earlier schemas keyed contracts on contract_id alone, and CREATE TABLE IF
+    NOT EXISTS would keep them. Every partitioned table is derived from the
+    staging tables, so they are dropped and their stages cleared from the
+    manifest; the next run recreates and refills them. Returns True if
+    anything was dropped.
+    """
+    pk_columns = primary_key_columns(conn, 'contracts')
+    if not pk_columns or 'year' in pk_columns:
+        return False
+    # Referencing tables first, contracts last
+    for table in reversed(PARTITIONED_TABLES):
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    has_manifest = conn.execute(text(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'etl_manifest'"
+    )).scalar()
+    if has_manifest:
+        conn.execute(text("DELETE FROM etl_manifest WHERE stage IN :stages").bindparams(
+            bindparam('stages', expanding=True)), {'stages': PARTITIONED_STAGES})
+    return True
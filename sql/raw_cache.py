@@ -0,0 +1,57 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pandas as pd
+
+# Parsed CMS CSVs are cached here as Parquet (other caches live in their own
+# data/cache/ subdirectories, so clear_cache leaves them alone)
+CACHE_DIR = "data/cache/csv"
+
+# Bump when a parser changes its output so old cache files are ignored
+CACHE_VERSION = 1
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_path(file_path, parser, content_hash, cache_dir=CACHE_DIR):
+    """Parquet path for one (file contents, parser) pair"""
+    key = f"{parser.__name__}-v{CACHE_VERSION}-{content_hash[:16]}"
+    return Path(cache_dir) / f"{Path(file_path).stem}.{key}.parquet"
+
+def read_cached(file_path, parser, *args, cache_dir=CACHE_DIR):
+    """Return parser(file_path, *args), parsing the CSV only once per content hash.
+
+    The parsed, header-normalized frame is stored as Parquet, replacing the
+    cache entries of older versions of the same CSV. Later reads memory-map
+    the Parquet file instead of re-tokenizing the CSV text.
+    """
+    content_hash = file_hash(file_path)
+    path = cache_path(file_path, parser, content_hash, cache_dir)
+    if path.exists():
+        return pd.read_parquet(path, memory_map=True)
+
+    df = parser(file_path, *args)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for stale in path.parent.glob(f"{Path(file_path).stem}.{parser.__name__}-*.parquet"):
+        stale.unlink()
+
+    # Write to a temp file first so a concurrent reader never sees a partial file
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return df
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """Delete every cached parsed CSV"""
+    removed = 0
+    for path in Path(cache_dir).glob("*.parquet"):
+        path.unlink()
+        removed += 1
+    return removed
@@ -0,0 +1,204 @@
+import argparse
+import importlib
+import json
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from db import backend, pool_stats, transaction
+from instrumentation import get_logger, stage_span
+from partitions import drop_legacy_tables
+from workbooks import load_workbooks
+
+load_data = importlib.import_module('02_load_data')
+transform = importlib.import_module('03_transform')
+export = importlib.import_module('07_export_for_powerbi')
+
+log = get_logger('pipeline')
+
+SQL_DIR = Path(__file__).resolve().parent
+
+# Schema script per backend (DuckDB has no UNLOGGED tables or partial indexes)
+SCHEMA_FILES = {
+    'postgresql': '01_schema.sql',
+    'duckdb': '01_schema_embedded.sql',
+}
+
+# Completed stages of an unfinished run, so `--resume` can skip them
+STATE_FILE = "data/pipeline_state.json"
+
+def split_sql(script):
+    """Split a SQL script into statements (the sql/ scripts keep ';' out of string literals)"""
+    # Drop -- comments first, they may contain ';'
+    code = re.sub(r'--[^\n]*', '', script)
+    return [statement.strip() for statement in code.split(';') if statement.strip()]
+
+def run_sql_file(file_name):
+    """Run every statement of a sql/ script in one transaction, logging any result sets"""
+    script = (SQL_DIR / file_name).read_text(encoding='utf-8')
+    with stage_span(Path(file_name).stem), transaction() as conn:
+        # no_parameters keeps the DBAPI from treating '%' in the SQL as a placeholder
+        conn = conn.execution_options(no_parameters=True)
+        for statement in split_sql(script):
+            result = conn.exec_driver_sql(statement)
+            if result.returns_rows:
+                log.info(pd.DataFrame(result.fetchall(), columns=list(result.keys())).to_string(index=False))
+
+def create_schema():
+    """Create the tables of the configured backend, first dropping pre-partitioning ones"""
+    with transaction() as conn:
+        if drop_legacy_tables(conn):
+            log.info("Dropped production tables without year keys; they are rebuilt from staging")
+    run_sql_file(SCHEMA_FILES[backend()])
+
+# Stage name -> the tables (or files) it reads and writes, and how to run it.
+# A stage waits for every stage that writes one of its inputs; stages with
+# disjoint inputs run concurrently.
+STAGES = {
+    'schema': {
+        'inputs': [],
+        'outputs': ['schema'],
+        'run': create_schema,
+    },
+    # Every release is parsed in parallel and staged in one transaction; only
+    # years whose files changed since the last load are parsed and restaged
+    'load_releases': {
+        'inputs': ['schema'],
+        'outputs': ['staging_summary_ratings', 'staging_measure_stars', 'staging_measure_data',
+                    'staging_part_c_cutpoints', 'staging_part_d_cutpoints', 'data_quality_report'],
+        'run': load_data.load_all_releases,
+    },
+    'load_workbooks': {
+        'inputs': ['schema'],
+        'outputs': ['staging_report_card_domain_stars', 'staging_report_card_cai',
+                    'staging_report_card_disenrollment', 'staging_report_card_performance',
+                    'staging_pqa_ndc_value_sets'],
+        'run': load_workbooks,
+    },
+    'transform_contracts': {
+        'inputs': ['staging_summary_ratings'],
+        'outputs': ['contracts'],
+        'run': transform.transform_contracts,
+    },
+    'transform_measure_metadata': {
+        'inputs': ['staging_measure_stars'],
+        'outputs': ['measure_metadata'],
+        'run': transform.transform_measure_metadata,
+    },
+    # Also reweights the existing facts and clears the rollup manifest entries
+    # of the years it changed, so the rollup has to wait for it
+    'update_weights': {
+        'inputs': ['measure_metadata'],
+        'outputs': ['measure_weights', 'contract_measure_facts', 'etl_manifest'],
+        'run': lambda: run_sql_file('05_update_weights.sql'),
+    },
+    'transform_measure_scores': {
+        'inputs': ['staging_measure_stars', 'contracts', 'measure_metadata'],
+        'outputs': ['measure_scores', 'data_quality_report'],
+        'run': transform.transform_measure_scores,
+    },
+    'transform_measure_values': {
+        'inputs': ['staging_measure_data', 'contracts', 'measure_metadata'],
+        'outputs': ['measure_values', 'data_quality_report'],
+        'run': transform.transform_measure_values,
+    },
+    'transform_cut_points': {
+        'inputs': ['staging_part_c_cutpoints', 'staging_part_d_cutpoints', 'measure_metadata'],
+        'outputs': ['cut_points'],
+        'run': transform.transform_cut_points,
+    },
+    'build_contract_measure_facts': {
+        'inputs': ['measure_scores', 'contracts', 'measure_metadata', 'measure_weights'],
+        'outputs': ['contract_measure_facts'],
+        'run': transform.build_contract_measure_facts,
+    },
+    'build_parent_org_rollup': {
+        'inputs': ['contract_measure_facts', 'measure_weights'],
+        'outputs': ['parent_org_rollup'],
+        'run': transform.build_parent_org_rollup,
+    },
+    'data_quality': {
+        'inputs': ['data_quality_report'],
+        'outputs': [],
+        'run': lambda: run_sql_file('04_data_quality.sql'),
+    },
+    'export_data': {
+        'inputs': ['contracts', 'contract_measure_facts', 'parent_org_rollup'],
+        'outputs': ['powerbi_data'],
+        'run': export.export_data,
+    },
+}
+
+def stage_dependencies(stages=STAGES):
+    """{stage: set of stages that write one of its inputs}"""
+    writers = {}
+    for name, stage in stages.items():
+        for output in stage['outputs']:
+            writers.setdefault(output, set()).add(name)
+    return {
+        name: {writer for table in stage['inputs'] for writer in writers.get(table, ())} - {name}
+        for name, stage in stages.items()
+    }
+
+def read_state(state_file=STATE_FILE):
+    path = Path(state_file)
+    return json.loads(path.read_text()) if path.exists() else {'completed': []}
+
+def write_state(state, state_file=STATE_FILE):
+    path = Path(state_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(state, indent=2))
+
+def run_pipeline(stages=STAGES, max_workers=4, resume=False, state_file=STATE_FILE):
+    """Run the stages as a DAG, each as soon as the stages it depends on have finished.
+
+    On failure no new stages are started, running ones finish, and the
+    completed stages are written to state_file; resume=True then skips them
+    and restarts from the failed stage. A successful run removes the file.
+    """
+    dependencies = stage_dependencies(stages)
+    completed = set(read_state(state_file)['completed']) & set(stages) if resume else set()
+    if completed:
+        log.info(f"Resuming, skipping completed stages: {', '.join(sorted(completed))}")
+
+    pending = set(stages) - completed
+    failed = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            if failed is None:
+                for name in sorted(pending):
+                    if dependencies[name] <= completed:
+                        log.info(f"Starting {name}")
+                        running[executor.submit(stages[name]['run'])] = name
+                        pending.discard(name)
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    log.exception(f"Stage {name} failed")
+                    failed = failed or name
+                else:
+                    completed.add(name)
+            write_state({'completed': sorted(completed), 'failed': failed}, state_file)
+
+    if failed is not None:
+        raise RuntimeError(f"Pipeline stopped at {failed}; rerun with --resume to continue from there")
+
+    Path(state_file).unlink(missing_ok=True)
+    log.info(f"Pipeline finished ({len(stages)} stages). Connection pool: {pool_stats()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ETL stages as a dependency graph")
+    parser.add_argument('--resume', action='store_true', help="skip stages completed by the last failed run")
+    parser.add_argument('--workers', type=int, default=4, help="stages run concurrently")
+    args = parser.parse_args()
+
+    run_pipeline(max_workers=args.workers, resume=args.resume)
@@ -0,0 +1,108 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db import transaction
+from instrumentation import get_logger
+
+log = get_logger('star_engine')
+
+# Star levels that have a lower threshold (1 star is whatever is left)
+STAR_LEVELS = [2.0, 3.0, 4.0, 5.0]
+
+def load_thresholds(conn, year):
+    """Load one year's cut points as a (measures x star levels) threshold matrix.
+
+    Returns (measure_ids, thresholds, higher_is_better, inclusive): thresholds
+    holds the 2-5 star cut points (NaN when a level is missing), inclusive
+    marks '>=' / '<=' / '=' thresholds. A measure is higher-is-better when its
+    thresholds rise with the star level.
+    """
+    cut_points = pd.read_sql(
+        text("SELECT measure_id, star_level, cut_point, operator FROM cut_points WHERE year = :year"),
+        conn, params={'year': int(year)}
+    )
+    cut_points = cut_points[cut_points['star_level'].astype(float).isin(STAR_LEVELS)]
+
+    thresholds = (cut_points.pivot(index='measure_id', columns='star_level', values='cut_point')
+                  .reindex(columns=STAR_LEVELS).astype(float))
+    operators = (cut_points.pivot(index='measure_id', columns='star_level', values='operator')
+                 .reindex(index=thresholds.index, columns=STAR_LEVELS))
+
+    values = thresholds.to_numpy()
+    lowest = pd.DataFrame(values).bfill(axis=1).iloc[:, 0].to_numpy()
+    highest = pd.DataFrame(values).ffill(axis=1).iloc[:, -1].to_numpy()
+    higher_is_better = ~(highest < lowest)
+    inclusive = operators.fillna('').apply(lambda col: col.str.contains('=')).to_numpy()
+    return thresholds.index.to_numpy(), values, higher_is_better, inclusive
+
+def assign_stars(values, thresholds, higher_is_better, inclusive, shift=0.0):
+    """Assign stars to a (contracts x measures) matrix of raw values in one pass.
+
+    Values and thresholds are sign-flipped for lower-is-better measures so
+    every threshold row rises with the star level; a contract's stars are then
+    1 + the number of thresholds it clears. shift (scalar or one value per
+    measure) moves every cut point by that many units, a positive shift making
+    stars harder to earn. Returns stars as floats, NaN where the value is NaN.
+    """
+    sign = np.where(higher_is_better, 1.0, -1.0)
+    shift = np.broadcast_to(np.asarray(shift, dtype=float), sign.shape)
+
+    signed_thresholds = (thresholds * sign[:, None] + shift[:, None])[None, :, :]
+    signed_values = (values * sign)[:, :, None]
+
+    cleared = np.where(inclusive[None, :, :],
+                       signed_values >= signed_thresholds,
+                       signed_values > signed_thresholds)
+    stars = 1.0 + cleared.sum(axis=2)
+    stars[np.isnan(values)] = np.nan
+    return stars
+
+def load_values(conn, year, measure_ids):
+    """Load one year's measure_values as a (contracts x measures) matrix in measure_ids order"""
+    values = pd.read_sql(
+        text("SELECT contract_id, measure_id, value FROM measure_values WHERE year = :year AND value IS NOT NULL"),
+        conn, params={'year': int(year)}
+    )
+    matrix = (values.pivot(index='contract_id', columns='measure_id', values='value')
+              .reindex(columns=measure_ids).astype(float))
+    return matrix.index.to_numpy(), matrix.to_numpy()
+
+def recompute_stars(year, shift=0.0):
+    """Recompute every contract x measure star of a year from measure_values and cut_points.
+
+    Returns a long DataFrame with the raw value, the recomputed stars and the
+    stars CMS published in measure_scores.
+    """
+    with transaction() as conn:
+        measure_ids, thresholds, higher_is_better, inclusive = load_thresholds(conn, year)
+        contract_ids, values = load_values(conn, year, measure_ids)
+        published = pd.read_sql(
+            text("SELECT contract_id, measure_id, score AS cms_stars FROM measure_scores WHERE year = :year"),
+            conn, params={'year': int(year)}
+        )
+
+    start = time.perf_counter()
+    stars = assign_stars(values, thresholds, higher_is_better, inclusive, shift)
+    log.info(f"Assigned {np.count_nonzero(~np.isnan(stars))} stars for {year} "
+             f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    results = pd.DataFrame({
+        'contract_id': np.repeat(contract_ids, len(measure_ids)),
+        'measure_id': np.tile(measure_ids, len(contract_ids)),
+        'value': values.ravel(),
+        'stars': stars.ravel(),
+    }).dropna(subset=['value'])
+    return results.merge(published, on=['contract_id', 'measure_id'], how='left')
+
+if __name__ == "__main__":
+    with transaction() as conn:
+        years = [row[0] for row in conn.exec_driver_sql("SELECT DISTINCT year FROM measure_values ORDER BY year")]
+
+    for year in years:
+        results = recompute_stars(year)
+        compared = results.dropna(subset=['cms_stars'])
+        matches = (compared['stars'] == compared['cms_stars'].astype(float)).mean() if len(compared) else float('nan')
+        log.info(f"  {year}: {len(results)} values, {matches:.1%} match the published Measure Stars")
@@ -0,0 +1,114 @@
+import sys
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from db import transaction
+
+# Every query below filters measure_scores / contracts on literal years (bound
+# parameters are inlined by the driver), so Postgres prunes to those years'
+# partitions at plan time and a query costs the same however many years are loaded.
+
+def _id_filters(params, contract_ids=None, measure_ids=None, alias='cur'):
+    """SQL conditions limiting a query to some contracts / measures; adds their params"""
+    clause = ''
+    for column, ids in (('contract_id', contract_ids), ('measure_id', measure_ids)):
+        if ids:
+            clause += f" AND {alias}.{column} IN :{column}s"
+            params[f'{column}s'] = list(ids)
+    return clause
+
+def _read(query, params):
+    """Run a query into a DataFrame, expanding list parameters for IN"""
+    query = text(query).bindparams(*(bindparam(name, expanding=True)
+                                     for name, value in params.items() if isinstance(value, list)))
+    with transaction() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+def star_movement(year, prior_year=None, contract_ids=None, measure_ids=None):
+    """Measure star change of every contract x measure scored in both years.
+
+    prior_year defaults to the year before. Returns contract_id, measure_id,
+    prior_score, score and change (score - prior_score).
+    """
+    prior_year = year - 1 if prior_year is None else prior_year
+    params = {'year': int(year), 'prior_year': int(prior_year)}
+    movement = _read(f"""
+        SELECT cur.contract_id, cur.measure_id,
+               prev.score AS prior_score, cur.score,
+               cur.score - prev.score AS change
+        FROM measure_scores cur
+        JOIN measure_scores prev
+          ON prev.year = :prior_year
+         AND prev.contract_id = cur.contract_id
+         AND prev.measure_id = cur.measure_id
+        WHERE cur.year = :year
+        AND cur.score IS NOT NULL
+        AND prev.score IS NOT NULL
+        {_id_filters(params, contract_ids, measure_ids)}
+    """, params)
+    return movement.astype({'prior_score': float, 'score': float, 'change': float})
+
+def star_trend(first_year, last_year, contract_ids=None, measure_ids=None):
+    """Measure stars of each contract x measure for every year in [first_year, last_year].
+
+    One row per contract, measure and year, with the star of the previous
+    loaded year and the change from it (NULL in a pair's first year).
+    """
+    params = {'first_year': int(first_year), 'last_year': int(last_year)}
+    trend = _read(f"""
+        SELECT cur.year, cur.contract_id, cur.measure_id, cur.score,
+               LAG(cur.score) OVER pair AS prior_score,
+               cur.score - LAG(cur.score) OVER pair AS change
+        FROM measure_scores cur
+        WHERE cur.year BETWEEN :first_year AND :last_year
+        {_id_filters(params, contract_ids, measure_ids)}
+        WINDOW pair AS (PARTITION BY cur.contract_id, cur.measure_id ORDER BY cur.year)
+        ORDER BY cur.contract_id, cur.measure_id, cur.year
+    """, params)
+    return trend.astype({'score': float, 'prior_score': float, 'change': float})
+
+def rating_movement(year, prior_year=None):
+    """Overall star rating change of every contract rated in both years"""
+    prior_year = year - 1 if prior_year is None else prior_year
+    movement = _read("""
+        SELECT cur.contract_id, cur.contract_name,
+               prev.overall_star_rating AS prior_rating, cur.overall_star_rating AS rating,
+               cur.overall_star_rating - prev.overall_star_rating AS change
+        FROM contracts cur
+        JOIN contracts prev
+          ON prev.year = :prior_year
+         AND prev.contract_id = cur.contract_id
+        WHERE cur.year = :year
+        AND cur.overall_star_rating IS NOT NULL
+        AND prev.overall_star_rating IS NOT NULL
+        ORDER BY change, cur.contract_id
+    """, {'year': int(year), 'prior_year': int(prior_year)})
+    return movement.astype({'prior_rating': float, 'rating': float, 'change': float})
+
+def movement_summary(movement):
+    """Per-measure counts of contracts that improved, declined or held, and the mean change"""
+    direction = pd.cut(movement['change'], [-float('inf'), -0.5, 0, float('inf')],
+                       labels=['declined', 'unchanged', 'improved'])
+    summary = (movement.assign(direction=direction)
+               .pivot_table(index='measure_id', columns='direction', values='change',
+                            aggfunc='size', fill_value=0, observed=False))
+    summary['avg_change'] = movement.groupby('measure_id')['change'].mean().round(2)
+    return summary.sort_values('avg_change')
+
+if __name__ == "__main__":
+    # python sql/trends.py [year [prior_year]]
+    with transaction() as conn:
+        years = [row[0] for row in conn.exec_driver_sql("SELECT DISTINCT year FROM contracts ORDER BY year")]
+    if len(sys.argv) < 2 and len(years) < 2:
+        sys.exit(f"Need two rating years to compare, found {years}")
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else years[-1]
+    prior_year = int(sys.argv[2]) if len(sys.argv) > 2 else year - 1
+
+    movement = star_movement(year, prior_year)
+    print(f"Measure star movement {prior_year} -> {year} ({len(movement)} contract x measure pairs):")
+    print(movement_summary(movement).to_string())
+
+    ratings = rating_movement(year, prior_year)
+    print(f"\nOverall rating movement {prior_year} -> {year} ({len(ratings)} contracts):")
+    print(ratings['change'].value_counts().sort_index().to_string())
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from instrumentation import get_logger
+
+log = get_logger('validation')
+
+# Contract info columns of the wide Measure Stars / Measure Data frames
+MEASURE_INFO_COLUMNS = ['CONTRACT_ID', 'Organization Type', 'Contract Name',
+                        'Organization Marketing Name', 'Parent Organization', 'year']
+
+# Valid star values: summary ratings use half stars, measure stars whole stars
+HALF_STARS = [1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]
+WHOLE_STARS = [1.0, 2.0, 3.0, 4.0, 5.0]
+
+# Release table -> contract ID column, checked columns ('measures' for every
+# measure column) and the values a numeric cell may take (None: any number)
+VALIDATIONS = {
+    'summary_ratings': {
+        'key': 'contract_id',
+        'columns': ['part_c_summary_star', 'part_d_summary_star', 'overall_star_rating'],
+        'valid': HALF_STARS,
+    },
+    'measure_stars': {'key': 'CONTRACT_ID', 'columns': 'measures', 'valid': WHOLE_STARS},
+    # Measure Data holds raw rates ("86%"), so only their status text is checked
+    'measure_data': {'key': 'CONTRACT_ID', 'columns': 'measures', 'valid': None},
+}
+
+# A load or transform fails, and nothing is committed, when more than this
+# share of its rows has a rejected row or cell
+MAX_REJECTED_SHARE = 0.01
+
+REPORT_COLUMNS = ['year', 'check_name', 'column_name', 'reason', 'row_count']
+REJECTED_COLUMNS = ['year', 'contract_id', 'measure_id', 'column_name', 'value', 'reason']
+
+class DataQualityError(ValueError):
+    """Raised when a stage rejects more rows than MAX_REJECTED_SHARE allows"""
+
+def checked_columns(df, config):
+    if config['columns'] == 'measures':
+        return [col for col in df.columns
+                if col not in MEASURE_INFO_COLUMNS and not str(col).startswith('unused_col_')]
+    return [col for col in config['columns'] if col in df.columns]
+
+def validate_frame(table, df):
+    """Run the vectorized checks of VALIDATIONS[table] on one parsed release frame.
+
+    - missing or duplicate contract IDs per year: the row is rejected
+    - non-numeric cells ("Plan too new to be measured"): counted by reason
+      in the report and kept, the transforms load them as NULL
+    - numbers outside the valid star values: the cell is rejected and blanked
+
+    Returns (rows to stage, report, rejected): report counts every check per
+    year, column and reason, rejected lists each dropped row or blanked cell.
+    """
+    config = VALIDATIONS.get(table)
+    if config is None:
+        return df, pd.DataFrame(columns=REPORT_COLUMNS), pd.DataFrame(columns=REJECTED_COLUMNS)
+
+    ids = df[config['key']].astype('string').str.strip()
+    missing_key = ids.isna() | ids.eq('')
+    duplicate_key = pd.DataFrame({'year': df['year'], 'id': ids}).duplicated() & ~missing_key
+    row_rejects = pd.concat([
+        pd.DataFrame({'year': df['year'][bad], 'contract_id': ids[bad], 'reason': reason})
+        for reason, bad in (('missing_contract_id', missing_key), ('duplicate_key', duplicate_key))
+    ])
+    reports = [
+        df.groupby('year').size().rename('row_count').reset_index().assign(check_name='rows'),
+        row_rejects.groupby(['year', 'reason']).size().rename('row_count').reset_index()
+        .assign(check_name=lambda counts: counts['reason']),
+    ]
+    rejected = [row_rejects]
+
+    clean = df[~(missing_key | duplicate_key)].copy()
+    columns = checked_columns(clean, config)
+    if columns:
+        cells = pd.DataFrame({
+            'row': np.repeat(clean.index.to_numpy(), len(columns)),
+            'year': np.repeat(clean['year'].to_numpy(), len(columns)),
+            'contract_id': np.repeat(ids[clean.index].to_numpy(), len(columns)),
+            'column_name': np.tile(np.array(columns, dtype=object), len(clean)),
+            'value': clean[columns].to_numpy(dtype=object).ravel(),
+        })
+        values = cells['value'].astype('string').str.strip()
+        numbers = pd.to_numeric(values.str.replace(r'\s*%$', '', regex=True), errors='coerce')
+        filled = values.notna() & values.ne('')
+
+        status = filled & numbers.isna()
+        reports.append(cells[status].assign(check_name='non_numeric', reason=values[status])
+                       .groupby(['year', 'check_name', 'column_name', 'reason']).size()
+                       .rename('row_count').reset_index())
+
+        if config['valid'] is not None:
+            out_of_range = numbers.notna() & ~numbers.isin(config['valid'])
+            bad_cells = cells[out_of_range]
+            reports.append(bad_cells.assign(check_name='out_of_range', reason='out_of_range')
+                           .groupby(['year', 'check_name', 'column_name', 'reason']).size()
+                           .rename('row_count').reset_index())
+            rejected.append(bad_cells[['year', 'contract_id', 'column_name', 'value']]
+                            .assign(reason='out_of_range'))
+            for column, rows in bad_cells.groupby('column_name')['row']:
+                clean.loc[rows, column] = pd.NA
+
+    report = pd.concat(reports, ignore_index=True).reindex(columns=REPORT_COLUMNS)
+    rejected = pd.concat(rejected, ignore_index=True).reindex(columns=REJECTED_COLUMNS)
+    # "C01: Breast Cancer Screening" -> "C01"; summary rating columns have none
+    rejected['measure_id'] = rejected['column_name'].astype('string').str.extract(r'^([A-Z]\d+)\s*:', expand=False)
+    return clean, report, rejected
+
+def record_validation(conn, stage, years, report, rejected):
+    """Replace the report and rejected rows of `stage` for `years` in the caller's transaction"""
+    years = [int(year) for year in years]
+    for table in ('data_quality_report', 'rejected_rows'):
+        conn.execute(text(f"DELETE FROM {table} WHERE stage = :stage AND year IN :years").bindparams(
+            bindparam('years', expanding=True)), {'stage': stage, 'years': years})
+    if len(report):
+        conn.execute(text("""
+            INSERT INTO data_quality_report (stage, year, check_name, column_name, reason, row_count)
+            VALUES (:stage, :year, :check_name, :column_name, :reason, :row_count)
+        """), _records(report.assign(stage=stage)))
+    if len(rejected):
+        conn.execute(text("""
+            INSERT INTO rejected_rows (stage, year, contract_id, measure_id, column_name, value, reason)
+            VALUES (:stage, :year, :contract_id, :measure_id, :column_name, :value, :reason)
+        """), _records(rejected.assign(stage=stage, value=rejected['value'].astype('string'))))
+
+def _records(df):
+    """DataFrame -> list of dicts with None for missing values and plain Python ints"""
+    df = df.astype(object).where(df.notna(), None)
+    return [{key: int(value) if isinstance(value, np.integer) else value for key, value in record.items()}
+            for record in df.to_dict('records')]
+
+def check_rejections(stage, rows, rejected_rows, rejected):
+    """Raise DataQualityError when more than MAX_REJECTED_SHARE of a stage's `rows` were rejected.
+
+    rejected_rows counts rows in the same unit as rows (release rows for the
+    loads, unpivoted score/value rows for the transforms); rejected lists the
+    rejected rows and cells by reason.
+    """
+    if not len(rejected):
+        return
+    counts = rejected['reason'].value_counts().to_dict()
+    log.warning(f"  {stage}: rejected {rejected_rows} of {rows} rows {counts}")
+    if rows and rejected_rows / rows > MAX_REJECTED_SHARE:
+        raise DataQualityError(
+            f"{stage}: {rejected_rows} of {rows} rows rejected ({counts}), "
+            f"above the {MAX_REJECTED_SHARE:.0%} limit; nothing was committed"
+        )
+
+def validate_release(conn, table, df):
+    """Validate a parsed release frame, record the results and return the rows to stage"""
+    clean, report, rejected = validate_frame(table, df)
+    stage = f'load_{table}'
+    record_validation(conn, stage, df['year'].unique(), report, rejected)
+    # Dropped rows plus kept rows with a blanked cell (their keys are unique)
+    blanked = rejected[rejected['reason'] == 'out_of_range'][['year', 'contract_id']].drop_duplicates()
+    check_rejections(stage, len(df), len(df) - len(clean) + len(blanked), rejected)
+    return clean
+
+def reject_orphans(conn, source_table, references, value_column):
+    """Delete rows of source_table whose IDs are missing from a referenced table.
+
+    references is a list of (reason, referenced table, join columns). Runs on
+    the already materialized source of a transform, so the foreign keys never
+    fail a whole year over a few rows. Returns the deleted rows with their
+    reason, value_column as their value and their measure ID as column_name.
+    """
+    rejected = []
+    for reason, ref_table, columns in references:
+        condition = ' AND '.join(f"ref.{col} = {source_table}.{col}" for col in columns)
+        result = conn.execute(text(f"""
+            DELETE FROM {source_table}
+            WHERE NOT EXISTS (SELECT 1 FROM {ref_table} ref WHERE {condition})
+            RETURNING {source_table}.*
+        """))
+        rows = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+        if len(rows):
+            rejected.append(rows.rename(columns={value_column: 'value'})
+                            .assign(column_name=rows['measure_id'], reason=reason))
+    if not rejected:
+        return pd.DataFrame(columns=REJECTED_COLUMNS)
+    return pd.concat(rejected, ignore_index=True).reindex(columns=REJECTED_COLUMNS)
+
+def record_transform_rejections(conn, stage, year, source_rows, rejected):
+    """Record the rows a transform read and rejected for one year; raises like validate_release"""
+    report = pd.DataFrame([{'year': year, 'check_name': 'rows', 'row_count': source_rows + len(rejected)}])
+    if len(rejected):
+        report = pd.concat([report, rejected.groupby('reason').size().rename('row_count').reset_index()
+                            .assign(year=year, check_name=lambda counts: counts['reason'])], ignore_index=True)
+    record_validation(conn, stage, [year], report.reindex(columns=REPORT_COLUMNS), rejected)
+    check_rejections(stage, source_rows + len(rejected), len(rejected), rejected)
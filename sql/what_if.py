@@ -0,0 +1,185 @@
+import time
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db import transaction
+
+# Rating a near-bonus plan needs to reach (CMS rounds to the nearest half star,
+# so a weighted average of 3.75 displays as 4.0)
+TARGET_RATING = 4.0
+
+# Star level an improved measure is raised to
+UPGRADE_TO = 4.0
+
+# Largest number of measures changed together (single, pair, triple)
+MAX_UPGRADES = 3
+
+# Contracts evaluated per batch when scoring measure combinations
+CHUNK_SIZE = 64
+
+def load_matrix(conn, year=None, overall_rating=None):
+    """Load contract_measure_facts as a dense (contracts x measures) score matrix.
+
+    Returns (contracts, measure_ids, scores, mask, weights): contracts is a
+    DataFrame with one row per (year, contract), scores holds the measure stars
+    with NaN where a contract has no score, mask marks the scored cells and
+    weights has one entry per measure.
+    """
+    query = """
+        SELECT year, contract_id, contract_name, overall_star_rating,
+               measure_id, weight, score
+        FROM contract_measure_facts
+        WHERE score IS NOT NULL
+    """
+    params = {}
+    if year is not None:
+        query += " AND year = :year"
+        params['year'] = int(year)
+    if overall_rating is not None:
+        query += " AND overall_star_rating = :overall_rating"
+        params['overall_rating'] = overall_rating
+    facts = pd.read_sql(text(query), conn, params=params)
+
+    contracts = (facts[['year', 'contract_id', 'contract_name', 'overall_star_rating']]
+                 .drop_duplicates(['year', 'contract_id'])
+                 .sort_values(['year', 'contract_id'])
+                 .reset_index(drop=True))
+    measure_ids = np.sort(facts['measure_id'].unique())
+
+    row = pd.MultiIndex.from_frame(contracts[['year', 'contract_id']]).get_indexer(
+        pd.MultiIndex.from_frame(facts[['year', 'contract_id']]))
+    col = np.searchsorted(measure_ids, facts['measure_id'].to_numpy())
+
+    scores = np.full((len(contracts), len(measure_ids)), np.nan)
+    scores[row, col] = facts['score'].to_numpy(dtype=float)
+    mask = ~np.isnan(scores)
+
+    weights = np.ones(len(measure_ids))
+    weights[col] = facts['weight'].fillna(1.0).to_numpy(dtype=float)
+    return contracts, measure_ids, scores, mask, weights
+
+def round_half_star(ratings):
+    """Round ratings to the nearest half star, rounding .25/.75 up like CMS"""
+    return np.floor(ratings * 2 + 0.5 + 1e-9) / 2
+
+def weighted_ratings(scores, mask, weights):
+    """Weighted average measure star of every contract, plus the half-star rating"""
+    weighted = np.where(mask, scores, 0.0) * weights
+    total_weight = (mask * weights).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = weighted.sum(axis=1) / total_weight
+    return average, round_half_star(average)
+
+def find_cheapest_upgrades(scores, mask, weights, target=TARGET_RATING,
+                           upgrade_to=UPGRADE_TO, max_upgrades=MAX_UPGRADES):
+    """Cheapest set of up to max_upgrades measures that lifts each contract to target.
+
+    Raising a measure to upgrade_to adds weight * (upgrade_to - score) to the
+    contract's weighted total and costs (upgrade_to - score) stars of
+    improvement. All contracts are scored against every combination of a
+    given size at once; contracts that cannot reach the target with the best
+    k measures, or already have a path no k-measure combination can beat,
+    are pruned before each size is tried.
+
+    Returns (best_cost, best_combo): best_cost is inf where no path exists and
+    best_combo holds measure column indices padded with -1.
+    """
+    n_contracts, n_measures = scores.shape
+    average, _ = weighted_ratings(scores, mask, weights)
+    total_weight = (mask * weights).sum(axis=1)
+
+    # Weighted points still missing for the rounded rating to reach target
+    need = (target - 0.25 - average) * total_weight - 1e-9
+
+    cost = np.where(mask, np.clip(upgrade_to - np.nan_to_num(scores), 0, None), 0.0)
+    gain = cost * weights
+
+    best_cost = np.where(need <= 0, 0.0, np.inf)
+    best_combo = np.full((n_contracts, max_upgrades), -1)
+
+    # Upper bound on what k upgrades can add, from each contract's k largest gains
+    top_gains = np.cumsum(-np.sort(-gain, axis=1), axis=1)
+    # Every upgrade raises a measure by at least this much
+    min_step = cost[cost > 0].min() if (cost > 0).any() else np.inf
+
+    for k in range(1, max_upgrades + 1):
+        if k > n_measures:
+            break
+        reachable = top_gains[:, k - 1] >= need
+        can_improve = best_cost > k * min_step
+        active = np.flatnonzero(reachable & can_improve & (need > 0))
+        if len(active) == 0:
+            continue
+
+        # Only measures that gain something for an active contract can help
+        candidates = np.flatnonzero((gain[active] > 0).any(axis=0))
+        if len(candidates) < k:
+            continue
+        combos = np.array(list(combinations(candidates, k)))
+
+        for start in range(0, len(active), CHUNK_SIZE):
+            rows = active[start:start + CHUNK_SIZE]
+            combo_gain = gain[rows][:, combos].sum(axis=2)
+            combo_cost = cost[rows][:, combos].sum(axis=2)
+            # A combo counts only if it reaches the target and every measure in it moves
+            valid = (combo_gain >= need[rows, None]) & (cost[rows][:, combos] > 0).all(axis=2)
+            combo_cost = np.where(valid, combo_cost, np.inf)
+
+            pick = combo_cost.argmin(axis=1)
+            picked_cost = combo_cost[np.arange(len(rows)), pick]
+            better = picked_cost < best_cost[rows]
+            best_cost[rows[better]] = picked_cost[better]
+            best_combo[rows[better]] = -1
+            best_combo[rows[better], :k] = combos[pick[better]]
+
+    return best_cost, best_combo
+
+def simulate(year=None, overall_rating=3.5, target=TARGET_RATING,
+             upgrade_to=UPGRADE_TO, max_upgrades=MAX_UPGRADES):
+    """Cheapest path to target for every contract at overall_rating in one rating year.
+
+    year defaults to the latest rating year. Returns a DataFrame with the
+    contract's current and simulated weighted rating, the measures to improve
+    and the stars of improvement needed.
+    """
+    with transaction() as conn:
+        if year is None:
+            year = conn.execute(text("SELECT MAX(year) FROM contract_measure_facts")).scalar()
+        contracts, measure_ids, scores, mask, weights = load_matrix(conn, year, overall_rating)
+
+    if contracts.empty:
+        return contracts
+
+    average, rating = weighted_ratings(scores, mask, weights)
+    best_cost, best_combo = find_cheapest_upgrades(scores, mask, weights, target, upgrade_to, max_upgrades)
+
+    upgraded = scores.copy()
+    for i, combo in enumerate(best_combo):
+        cols = combo[combo >= 0]
+        upgraded[i, cols] = np.maximum(upgraded[i, cols], upgrade_to)
+    new_average, new_rating = weighted_ratings(upgraded, mask, weights)
+
+    results = contracts.copy()
+    results['weighted_average'] = average.round(3)
+    results['simulated_rating'] = rating
+    results['measures_to_improve'] = [
+        ', '.join(measure_ids[combo[combo >= 0]]) for combo in best_combo
+    ]
+    results['stars_of_improvement'] = np.where(np.isinf(best_cost), np.nan, best_cost)
+    results['new_weighted_average'] = np.where(np.isinf(best_cost), np.nan, new_average.round(3))
+    results['new_rating'] = np.where(np.isinf(best_cost), np.nan, new_rating)
+    return results.sort_values(['stars_of_improvement', 'contract_id'], na_position='last').reset_index(drop=True)
+
+if __name__ == "__main__":
+    print("Simulating the cheapest path to 4.0 stars for 3.5-star plans...")
+    start = time.perf_counter()
+    results = simulate()
+    elapsed = time.perf_counter() - start
+
+    reachable = results['stars_of_improvement'].notna()
+    print(f"\n{reachable.sum()} of {len(results)} contracts reach {TARGET_RATING} "
+          f"with up to {MAX_UPGRADES} measure upgrades ({elapsed:.2f}s)")
+    print(results[reachable].head(20).to_string(index=False))
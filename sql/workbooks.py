@@ -0,0 +1,208 @@
+import importlib
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from xml.etree import ElementTree
+
+import pandas as pd
+
+from db import dispose_engine, transaction
+from etl_manifest import get_stage_hashes, record_stage
+from instrumentation import get_logger, instrumented, record_rows
+from raw_cache import CACHE_VERSION, file_hash
+
+load_data = importlib.import_module('02_load_data')
+
+log = get_logger('workbooks')
+
+RAW_DIR = "data/raw"
+
+# Converted sheets are cached here as Parquet, apart from the parsed CSVs
+CACHE_DIR = "data/cache/workbooks"
+
+# Workbook kind -> file name pattern
+WORKBOOK_PATTERNS = {
+    'report_card': r'\d{4}_Report_Card_Master_Table_.*\.xlsx',
+    'pqa': r'PQA_.*\.xlsx',
+}
+
+# (workbook kind, sheet name pattern) -> (staging table, header row index).
+# Sheets the CSV loaders already cover (Measure Stars, Summary Rating, ...)
+# are skipped; sheets of one staging table are stacked, with their name in 'sheet'.
+WORKBOOK_SHEETS = {
+    ('report_card', r'Domain_Stars'): ('staging_report_card_domain_stars', 1),
+    ('report_card', r'CAI'): ('staging_report_card_cai', 1),
+    ('report_card', r'Disenrollment Reasons'): ('staging_report_card_disenrollment', 1),
+    ('report_card', r'(High|Low)_Performing_Contracts'): ('staging_report_card_performance', 1),
+    # NDC value sets of the adherence (ADH) and statin use (SUPD) measures;
+    # 2024 names them "Diabetes", 2025 "NDC Diabetes"
+    ('pqa', r'(NDC )?(Diabetes|Insulins|RASA|Sacubitril_Valsartan|Statins|Antidiabetics|Fertility)'):
+        ('staging_pqa_ndc_value_sets', 0),
+}
+
+def release_year(path):
+    """Rating year of the release directory a workbook sits in ("2025-star-ratings-data-tables" -> 2025)"""
+    match = re.match(r'(\d{4})', Path(path).parent.name)
+    return int(match.group(1)) if match else None
+
+def discover_workbooks(raw_dir=RAW_DIR):
+    """Find the known workbooks under raw_dir: {path: (kind, year)}"""
+    workbooks = {}
+    for path in sorted(Path(raw_dir).glob('*/*.xlsx')):
+        for kind, pattern in WORKBOOK_PATTERNS.items():
+            if re.fullmatch(pattern, path.name) and release_year(path) is not None:
+                workbooks[str(path)] = (kind, release_year(path))
+    return workbooks
+
+def sheet_target(kind, sheet):
+    """(staging table, header row) of a sheet, or None when it is not loaded"""
+    for (sheet_kind, pattern), target in WORKBOOK_SHEETS.items():
+        if sheet_kind == kind and re.fullmatch(pattern, sheet.strip()):
+            return target
+    return None
+
+def list_sheets(path):
+    """Sheet names from xl/workbook.xml, without loading the cells or shared strings"""
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    namespace = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+    return [sheet.get('name') for sheet in root.find('main:sheets', namespace)]
+
+def header_names(cells):
+    """Column names from a header row: blanks become unused_col_N, repeats get a suffix"""
+    names, seen, blanks = [], {}, 0
+    for cell in cells:
+        name = str(cell).strip() if cell is not None else ''
+        if not name:
+            blanks += 1
+            name = f'unused_col_{blanks}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}_{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def read_sheet(path, sheet, header_row):
+    """Read one sheet as text cells (like the CSV staging tables) below its header row"""
+    # Imported here: only the worker processes parse workbooks
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = list(workbook[sheet].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+    columns = header_names(rows[header_row]) if len(rows) > header_row else []
+    data = [
+        [None if value is None else str(value) for value in row]
+        for row in rows[header_row + 1:]
+        if any(value is not None and str(value).strip() for value in row)
+    ]
+    df = pd.DataFrame(data, columns=columns, dtype='string')
+    # Trailing blank columns of the sheet's used range carry no data
+    unused = [col for col in df.columns if col.startswith('unused_col_') and df[col].isna().all()]
+    return df.drop(columns=unused)
+
+def sheet_cache_path(path, sheet, content_hash, cache_dir=CACHE_DIR):
+    slug = re.sub(r'\W+', '_', sheet.strip()).strip('_')
+    return Path(cache_dir) / f"{Path(path).stem}.sheet-{slug}-v{CACHE_VERSION}-{content_hash[:16]}.parquet"
+
+def convert_sheet(path, sheet, header_row, content_hash, cache_dir=CACHE_DIR):
+    """Parse one sheet into the Parquet cache unless this workbook version is cached; runs in a worker.
+
+    Returns (sheet, cache path, rows, parsed): parsed is False for cache hits.
+    """
+    cache_path = sheet_cache_path(path, sheet, content_hash, cache_dir)
+    if cache_path.exists():
+        return sheet, str(cache_path), None, False
+
+    df = read_sheet(path, sheet, header_row)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    for stale in cache_path.parent.glob(cache_path.name.rsplit('-v', 1)[0] + '-v*.parquet'):
+        stale.unlink(missing_ok=True)
+    # Write to a temp file first so a concurrent reader never sees a partial file
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+    return sheet, str(cache_path), len(df), True
+
+def workbook_hashes(workbooks):
+    """Combined content hash of each year's workbooks: {year: hash}"""
+    by_year = {}
+    for path, (_, year) in workbooks.items():
+        by_year.setdefault(year, []).append(file_hash(path))
+    return {year: ','.join(sorted(hashes)) for year, hashes in by_year.items()}
+
+@instrumented('load_workbooks')
+def load_workbooks(raw_dir=RAW_DIR, years=None, max_workers=None, force=False):
+    """Convert the Report Card Master Table and PQA workbooks into staging tables.
+
+    Every loaded sheet is parsed by its own worker process into a Parquet
+    file keyed on the workbook's content hash, so a sheet is only parsed
+    again when its workbook changes. The cached sheets are then stacked per
+    staging table (see WORKBOOK_SHEETS), with 'sheet' and 'year' columns, and
+    staged in one transaction. Only years (limited to `years` when given)
+    whose workbooks changed since the last load are restaged; the other
+    years stay in staging.
+    """
+    workbooks = discover_workbooks(raw_dir)
+    if years is not None:
+        workbooks = {path: (kind, year) for path, (kind, year) in workbooks.items() if year in years}
+    if not workbooks:
+        log.info(f"No workbooks found under {raw_dir}, skipping...")
+        return {}
+
+    year_hashes = workbook_hashes(workbooks)
+    with transaction() as conn:
+        loaded = get_stage_hashes(conn, 'load_workbooks')
+    year_hashes = {year: source_hash for year, source_hash in year_hashes.items()
+                   if force or loaded.get(year) != source_hash}
+    if not year_hashes:
+        log.info("Workbooks are unchanged since the last load, skipping...")
+        return {}
+    workbooks = {path: (kind, year) for path, (kind, year) in workbooks.items() if year in year_hashes}
+    hashes = {path: file_hash(path) for path in workbooks}
+    log.info(f"Loading workbooks: {', '.join(str(year) for year in sorted(year_hashes))}")
+
+    start = time.perf_counter()
+    tasks = []
+    for path, (kind, year) in workbooks.items():
+        for sheet in list_sheets(path):
+            target = sheet_target(kind, sheet)
+            if target is not None:
+                tasks.append((path, sheet, target, year))
+
+    frames = {}
+    parsed = 0
+    # The forked workers must not inherit the parent's pooled connections
+    dispose_engine()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            (path, target, year, pool.submit(convert_sheet, path, sheet, target[1], hashes[path]))
+            for path, sheet, target, year in tasks
+        ]
+        for _, (staging_table, _), year, future in futures:
+            sheet, cache_path, _, was_parsed = future.result()
+            parsed += was_parsed
+            df = pd.read_parquet(cache_path).assign(sheet=sheet.strip(), year=year)
+            frames.setdefault(staging_table, []).append(df)
+    log.info(f"Converted {len(tasks)} sheets ({parsed} parsed, {len(tasks) - parsed} cached) "
+             f"in {time.perf_counter() - start:.2f}s")
+
+    staging_frames = {table: pd.concat(parts, ignore_index=True) for table, parts in frames.items()}
+    with transaction() as conn:
+        load_data.load_to_staging(staging_frames, conn, years=sorted(year_hashes))
+        for year, source_hash in year_hashes.items():
+            rows = sum((df['year'] == year).sum() for df in staging_frames.values())
+            record_stage(conn, 'load_workbooks', year, source_hash, rows)
+    record_rows(rows_in=sum(len(df) for df in staging_frames.values()))
+    return staging_frames
+
+if __name__ == "__main__":
+    load_workbooks()
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from analysis import run_analysis
+from db import transaction
+from run_pipeline import split_sql
+
+SQL_FILE = Path(__file__).resolve().parents[1] / 'sql' / '06_analysis_queries.sql'
+
+def query_4():
+    """QUERY 4 of 06_analysis_queries.sql (recommendations for H0107), without its LIMIT"""
+    statement = next(sql for sql in split_sql(SQL_FILE.read_text(encoding='utf-8'))
+                     if "contract_id = 'H0107'" in sql)
+    return statement.replace('LIMIT 10', '')
+
+def test_plan_recommendations_match_query_4():
+    try:
+        with transaction() as conn:
+            expected = pd.read_sql(query_4(), conn)
+    except OperationalError:
+        pytest.skip("no database to run the analysis queries against")
+    if expected.empty:
+        pytest.skip("H0107 has no measures below 4 stars in the loaded data")
+
+    actual = run_analysis('plan_recommendations', use_cache=False,
+                          contract_id='H0107', target=4.0, limit=len(expected) + 1)
+
+    columns = ['measure_id', 'current_score', 'priority']
+    assert len(actual) == len(expected)
+    pd.testing.assert_frame_equal(
+        actual[columns].sort_values('measure_id').reset_index(drop=True),
+        expected[columns].sort_values('measure_id').reset_index(drop=True),
+        check_dtype=False,
+    )